@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Optional
+from typing import Optional, List
 
 from pydantic.v1 import BaseSettings
 
@@ -18,6 +18,17 @@ class Settings(BaseSettings):
     DB_PORT: str
     DB_NAME: str
     DATABASE_URL: Optional[str] = None
+    # Connection pools. The async engine serves the request queries, the sync one the ingestion workers and the
+    # handlers still on Session; a process holds at most the sum of the two POOL_SIZE + MAX_OVERFLOW connections
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_SYNC_POOL_SIZE: int = 5
+    DB_SYNC_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statement cache per connection, 0 when behind a transaction-pooling pgbouncer
+    DB_STATEMENT_CACHE_SIZE: int = 100
 
     # Keycloak settings
     KEYCLOAK_URL: str
@@ -25,6 +36,11 @@ class Settings(BaseSettings):
     KEYCLOAK_CLIENT_ID: str
     KEYCLOAK_CLIENT_SECRET: str
     KEYCLOAK_ALGORITHM: str = "RS256"
+    # Tokens are verified locally against the realm's JWKS, refetched after JWKS_TTL_SECONDS or, rate limited,
+    # when a token names an unknown key
+    JWKS_TTL_SECONDS: int = 3600
+    JWKS_MIN_REFRESH_SECONDS: int = 30
+    AUTH_CLAIMS_CACHE_SIZE: int = 10000
 
     # MinIO settings
     MINIO_HOST: str
@@ -32,7 +48,118 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str
     MINIO_SECURE: bool = False
     MINIO_BUCKET_NAME: str
+    MINIO_PART_SIZE: int = 10 * 1024 * 1024  # 10MB parts, also the memory bound of an upload
+    # Host and scheme of MinIO as seen by clients, for presigned download URLs (defaults to MINIO_HOST)
+    MINIO_PUBLIC_HOST: Optional[str] = None
+    MINIO_PUBLIC_SECURE: Optional[bool] = None
+    MINIO_REGION: str = "us-east-1"
 
+    # Download settings, DOWNLOAD_MODE is "proxy" (bytes relayed by the API) or "redirect" (to a presigned URL)
+    DOWNLOAD_MODE: str = "proxy"
+    DOWNLOAD_URL_EXPIRY_SECONDS: int = 300
+    DOWNLOAD_CHUNK_SIZE: int = 64 * 1024
+
+    # Upload settings
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024
+
+    # File listing settings
+    FILE_LIST_PAGE_SIZE: int = 100
+    FILE_LIST_MAX_PAGE_SIZE: int = 1000
+
+    # Reconciliation of the file index with the bucket, every FILE_RECONCILE_INTERVAL_SECONDS (0 only on demand).
+    # Objects referenced by no file nor pending job are orphans once older than FILE_RECONCILE_GRACE_SECONDS
+    FILE_RECONCILE_INTERVAL_SECONDS: int = 0
+    FILE_RECONCILE_GRACE_SECONDS: int = 3600
+    FILE_RECONCILE_DELETE_ORPHANS: bool = False
+
+    # Ingestion queue settings
+    INGESTION_WORKERS: int = 2
+    INGESTION_MAX_ATTEMPTS: int = 3
+    INGESTION_LEASE_SECONDS: int = 300
+    INGESTION_POLL_INTERVAL: float = 2.0
+    INGESTION_RETRY_BACKOFF_SECONDS: int = 30
+
+    # Bulk conversion settings (0 means derive from the CPU count)
+    CONVERSION_PROCESSES: int = 0
+    CONVERSION_MAX_PENDING: int = 0
+    BULK_REQUEST_CONCURRENCY: int = 4
+    BULK_MAX_FILES: int = 100
+
+    # Bulk delete settings
+    BULK_DELETE_MAX_FILES: int = 1000
+
+    # Executors of the blocking workloads run by request handlers. Requests are rejected with a 503 when the
+    # estimated wait in the queue of a workload exceeds its MAX_QUEUE_WAIT_SECONDS (0 never rejects)
+    CONVERSION_MAX_QUEUE_WAIT_SECONDS: float = 120.0
+    EMBEDDING_WORKERS: int = 2
+    EMBEDDING_MAX_QUEUE_WAIT_SECONDS: float = 30.0
+    CLASSIFICATION_WORKERS: int = 1
+    CLASSIFICATION_MAX_QUEUE_WAIT_SECONDS: float = 30.0
+    LLM_WORKERS: int = 1
+    LLM_MAX_QUEUE_WAIT_SECONDS: float = 60.0
+
+    # Embedding cache settings
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = ".cache/embeddings"
+    EMBEDDING_CACHE_SIZE_LIMIT: int = 2 * 1024 * 1024 * 1024
+
+    # Query embedding batching settings
+    QUERY_BATCH_MAX_SIZE: int = 32
+    QUERY_BATCH_MAX_WAIT_MS: float = 5.0
+    QUERY_EMBEDDING_LRU_SIZE: int = 1024
+
+    # Vector search settings. VECTOR_DISTANCE is "cosine", "l2" or "inner_product" and is used by every
+    # vector query, VECTOR_INDEX_TYPE is "hnsw", "ivfflat" or "none". VECTOR_MAX_DISTANCE only applies to cosine,
+    # the other metrics are not cut off
+    VECTOR_DISTANCE: str = "cosine"
+    VECTOR_MAX_DISTANCE: float = 0.5
+    VECTOR_INDEX_TYPE: str = "hnsw"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10
+    # pgvector >= 0.8 keeps scanning the index until filtered queries have enough rows, "" to leave it off
+    HNSW_ITERATIVE_SCAN: str = "relaxed_order"
+
+    # Full-text search settings, the stored search vectors of older rows are filled in batches at startup
+    SEARCH_BACKFILL_BATCH_SIZE: int = 500
+    SEARCH_BACKFILL_PAUSE_SECONDS: float = 0.1
+
+    # Search result cache settings, SEARCH_CACHE_BACKEND is "disk" (shared by the processes of a host) or
+    # "memory" (per process, only correct with a single worker); entries of a user are invalidated whenever
+    # their files change
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_BACKEND: str = "disk"
+    SEARCH_CACHE_TTL_SECONDS: int = 300
+    SEARCH_CACHE_MAX_ENTRIES: int = 10000
+    SEARCH_CACHE_DIR: str = ".cache/search"
+    SEARCH_CACHE_SIZE_LIMIT: int = 256 * 1024 * 1024
+
+    # Hybrid search settings, candidates taken from each ranking and fused with weighted reciprocal-rank fusion
+    HYBRID_LEXICAL_CANDIDATES: int = 50
+    HYBRID_VECTOR_CANDIDATES: int = 100
+    HYBRID_LEXICAL_WEIGHT: float = 1.0
+    HYBRID_VECTOR_WEIGHT: float = 1.0
+    HYBRID_RRF_K: int = 60
+
+    # Chunking settings, chunks are also capped to the embedding model sequence length
+    CHUNK_MAX_TOKENS: int = 200
+    CHUNK_OVERLAP_TOKENS: int = 32
+
+    # Category classification settings, CATEGORY_MODE is "embedding" or "zero-shot"
+    CATEGORY_MODE: str = "embedding"
+    CATEGORY_THRESHOLD: float = 0.80
+    CATEGORY_EMBEDDING_THRESHOLD: float = 0.30
+
+    # Inference settings, INFERENCE_BACKEND is "torch" or "onnx" (int8 quantized ONNX Runtime)
+    INFERENCE_BACKEND: str = "torch"
+    ONNX_MODEL_DIR: str = ".cache/onnx"
+    ONNX_QUANTIZATION: str = "avx512_vnni"  # arm64, avx2, avx512 or avx512_vnni
+    INFERENCE_PARITY_TOLERANCE: float = 0.02
+
+    # Models loaded at startup instead of on first use, e.g. ["sentence-transformers/all-MiniLM-L6-v2", "llm"]
+    WARMUP_MODELS: List[str] = []
 
     class Config:
         env_file = ".env"
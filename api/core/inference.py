@@ -0,0 +1,127 @@
+import os
+import sys
+from typing import List, Optional
+
+import numpy as np
+
+from core.config import get_settings
+
+settings = get_settings()
+
+BACKENDS = ("torch", "onnx")
+
+# Sample inputs used to compare the outputs of the backends
+PARITY_TEXTS = [
+    "Deep neural networks for protein structure prediction",
+    "## References",
+    "The effect of monetary policy on inflation in emerging markets",
+    "| Sample | Temperature (K) | Pressure (GPa) |",
+]
+
+
+def _onnx_dir(model_id: str) -> str:
+    return os.path.join(settings.ONNX_MODEL_DIR, model_id.replace("/", "--"))
+
+
+def load_embedding_model(model_id: str, backend: str):
+    """Load a sentence-transformers model with the torch or int8-quantized ONNX Runtime backend"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_id)
+    if backend != "onnx":
+        raise ValueError(f"Unknown inference backend {backend}, expected one of {BACKENDS}")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dir = _onnx_dir(model_id)
+    file_name = f"onnx/model_qint8_{settings.ONNX_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        # Export to fp32 ONNX once, then quantize the weights to int8
+        model = SentenceTransformer(model_id, backend="onnx")
+        model.save_pretrained(export_dir)
+        export_dynamic_quantized_onnx_model(model, settings.ONNX_QUANTIZATION, export_dir)
+
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def load_zero_shot_classifier(model_id: str, backend: str):
+    """Load a zero-shot classification pipeline with the torch or int8-quantized ONNX Runtime backend"""
+    from transformers import pipeline
+
+    if backend == "torch":
+        return pipeline("zero-shot-classification", model=model_id)
+    if backend != "onnx":
+        raise ValueError(f"Unknown inference backend {backend}, expected one of {BACKENDS}")
+
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    export_dir = _onnx_dir(model_id)
+    file_name = "model_quantized.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        model = ORTModelForSequenceClassification.from_pretrained(model_id, export=True)
+        quantization_config = getattr(AutoQuantizationConfig, settings.ONNX_QUANTIZATION)(is_static=False, per_channel=False)
+        ORTQuantizer.from_pretrained(model).quantize(save_dir=export_dir, quantization_config=quantization_config)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(export_dir)
+
+    model = ORTModelForSequenceClassification.from_pretrained(export_dir, file_name=file_name)
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+
+def check_embedding_parity(model_id: str, texts: Optional[List[str]] = None, tolerance: Optional[float] = None) -> dict:
+    """Compare ONNX embeddings against torch, passing when every cosine similarity is within tolerance of 1"""
+    texts = texts or PARITY_TEXTS
+    tolerance = settings.INFERENCE_PARITY_TOLERANCE if tolerance is None else tolerance
+
+    reference = load_embedding_model(model_id, "torch").encode(texts, normalize_embeddings=True)
+    candidate = load_embedding_model(model_id, "onnx").encode(texts, normalize_embeddings=True)
+    similarities = np.sum(reference * candidate, axis=1)
+
+    return {
+        "model": model_id,
+        "min_cosine_similarity": float(similarities.min()),
+        "tolerance": tolerance,
+        "passed": bool(similarities.min() >= 1 - tolerance)
+    }
+
+
+def check_classifier_parity(model_id: str, labels: List[str], texts: Optional[List[str]] = None,
+                            tolerance: Optional[float] = None) -> dict:
+    """Compare ONNX zero-shot label scores against torch, passing when no score moves more than tolerance"""
+    texts = texts or PARITY_TEXTS
+    tolerance = settings.INFERENCE_PARITY_TOLERANCE if tolerance is None else tolerance
+
+    def scores(classifier):
+        results = []
+        for text in texts:
+            result = classifier(text, labels, multi_class=True)
+            by_label = dict(zip(result["labels"], result["scores"]))
+            results.append([by_label[label] for label in labels])
+        return np.array(results)
+
+    difference = np.abs(scores(load_zero_shot_classifier(model_id, "torch")) -
+                        scores(load_zero_shot_classifier(model_id, "onnx")))
+
+    return {
+        "model": model_id,
+        "max_score_difference": float(difference.max()),
+        "tolerance": tolerance,
+        "passed": bool(difference.max() <= tolerance)
+    }
+
+
+if __name__ == "__main__":
+    # python -m core.inference: check the ONNX backend before enabling it
+    from core.registry import EMBEDDING_MODEL, ZERO_SHOT_MODEL
+    from services.categories import LABELS
+
+    reports = [
+        check_embedding_parity(EMBEDDING_MODEL),
+        check_classifier_parity(ZERO_SHOT_MODEL, LABELS),
+    ]
+    for report in reports:
+        print(report)
+    sys.exit(0 if all(report["passed"] for report in reports) else 1)
@@ -12,6 +12,16 @@ minio_client = Minio(
     secure=settings.MINIO_SECURE
 )
 
+# Client signing download URLs for the host browsers reach MinIO at, which is never contacted
+# by the API itself, so the region is given rather than looked up
+presign_client = Minio(
+    settings.MINIO_PUBLIC_HOST or settings.MINIO_HOST,
+    access_key=settings.MINIO_ACCESS_KEY,
+    secret_key=settings.MINIO_SECRET_KEY,
+    secure=settings.MINIO_SECURE if settings.MINIO_PUBLIC_SECURE is None else settings.MINIO_PUBLIC_SECURE,
+    region=settings.MINIO_REGION
+)
+
 
 # Ensure default bucket exists
 def init_minio():
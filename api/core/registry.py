@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from core.config import get_settings
+from core.inference import load_embedding_model, load_zero_shot_classifier
+
+settings = get_settings()
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+
+
+def _resident_memory() -> Optional[int]:
+    """Current resident set size of the process in bytes, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Loads each registered model on first use and shares the instance process-wide.
+
+    Load time and the resident memory growth observed while loading are recorded
+    for every model.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register how to load a model, without loading it"""
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """Get a model, loading it if this is its first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Model {name} is not registered")
+
+        with self._locks[name]:
+            if name not in self._models:
+                rss_before = _resident_memory()
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                rss_after = _resident_memory()
+                self._stats[name] = {
+                    "load_seconds": time.perf_counter() - started,
+                    "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None
+                }
+            return self._models[name]
+
+    def warm_up(self, names: Iterable[str]):
+        """Load the given models ahead of their first request"""
+        for name in names:
+            self.get(name)
+
+    def get_stats(self) -> dict:
+        return {
+            "process_rss_bytes": _resident_memory(),
+            "models": {
+                name: {"loaded": name in self._models, **self._stats.get(name, {})}
+                for name in self._loaders
+            }
+        }
+
+
+def _load_embedding_model():
+    return load_embedding_model(EMBEDDING_MODEL, settings.INFERENCE_BACKEND)
+
+
+def _load_zero_shot_classifier():
+    return load_zero_shot_classifier(ZERO_SHOT_MODEL, settings.INFERENCE_BACKEND)
+
+
+model_registry = ModelRegistry()
+model_registry.register(EMBEDDING_MODEL, _load_embedding_model)
+model_registry.register(ZERO_SHOT_MODEL, _load_zero_shot_classifier)
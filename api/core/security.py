@@ -1,5 +1,14 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import HTTPException, Security
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jwcrypto import jwk, jwt
 from keycloak import KeycloakOpenID
 
 from core.config import get_settings
@@ -18,13 +27,83 @@ keycloak_openid = KeycloakOpenID(
 oauth2_scheme = HTTPBearer()
 
 
+class TokenVerifier:
+    """
+    Verifies access tokens locally against the realm's cached JWKS.
+
+    The key set is fetched once and refreshed when a token is signed with an
+    unknown kid (key rotation), at most once every JWKS_MIN_REFRESH_SECONDS.
+    Validated claims are kept per token hash until the token expires, so a
+    token reused across requests is only verified once.
+    """
+
+    def __init__(self, client: KeycloakOpenID):
+        self.client = client
+        self._keys: Optional[jwk.JWKSet] = None
+        self._keys_fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._claims: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._stats = {"cache_hits": 0, "verifications": 0, "jwks_refreshes": 0}
+
+    def _keys_older_than(self, max_age: float) -> bool:
+        return self._keys is None or time.monotonic() - self._keys_fetched_at >= max_age
+
+    async def _refresh_keys(self, max_age: float):
+        """Fetch the JWKS when the cached one is older than max_age seconds"""
+        if not self._keys_older_than(max_age):
+            return
+        async with self._refresh_lock:
+            if not self._keys_older_than(max_age):
+                return  # Refreshed by a concurrent request
+            certs = await run_in_threadpool(self.client.certs)
+            self._keys = jwk.JWKSet.from_json(json.dumps(certs))
+            self._keys_fetched_at = time.monotonic()
+            self._stats["jwks_refreshes"] += 1
+
+    def _verify(self, token: str) -> dict:
+        verified = jwt.JWT(jwt=token, key=self._keys, algs=[settings.KEYCLOAK_ALGORITHM], expected_type="JWS")
+        return json.loads(verified.claims)
+
+    async def decode(self, token: str) -> dict:
+        """Get the claims of a valid token, raising for invalid or expired ones"""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._claims.get(key)
+        if cached is not None:
+            expires_at, claims = cached
+            if expires_at > time.time():
+                self._claims.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return claims
+            del self._claims[key]
+
+        await self._refresh_keys(settings.JWKS_TTL_SECONDS)
+        try:
+            claims = self._verify(token)
+        except jwt.JWTMissingKey:
+            # Signed with a key published after the last fetch
+            await self._refresh_keys(settings.JWKS_MIN_REFRESH_SECONDS)
+            claims = self._verify(token)
+        self._stats["verifications"] += 1
+
+        self._claims[key] = (float(claims["exp"]), claims)
+        while len(self._claims) > settings.AUTH_CLAIMS_CACHE_SIZE:
+            self._claims.popitem(last=False)
+        return claims
+
+    def get_stats(self) -> dict:
+        return self._stats | {"cached_tokens": len(self._claims)}
+
+
+token_verifier = TokenVerifier(keycloak_openid)
+
+
 async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Security(oauth2_scheme)
 ) -> User:
     """Decode and verify JWT token to get current user"""
     try:
         token = credentials.credentials
-        token_info = keycloak_openid.decode_token(token)
+        token_info = await token_verifier.decode(token)
 
         return User(
             username=token_info.get("preferred_username", ""),
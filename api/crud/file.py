@@ -1,9 +1,13 @@
 # app/crud/file.py
-from typing import List, Optional, Type
+from typing import List, Optional, Type, Tuple, Any
+from sqlalchemy import or_, select, func, tuple_, update, literal_column
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
 
-from models.file import FileMetadata
+from models.file import FileMetadata, FileEmbedding
+from services.searchCache import get_search_cache
 
 
 def create_file_metadata(
@@ -12,11 +16,22 @@ def create_file_metadata(
         filename: str,
         content_type: str,
         file_metadata: dict,
-        content: str,
+        content: Optional[str],
         categories: list[str],
-        user_id: str
+        user_id: str,
+        content_hash: Optional[str] = None,
+        object_name: Optional[str] = None,
+        content_id: Optional[str] = None,
+        chunker_version: Optional[int] = None,
+        size: Optional[int] = None,
+        last_modified: Optional[datetime] = None,
+        vectors: Optional[list[dict]] = None
 ) -> FileMetadata:
-    """Create new file metadata entry"""
+    """
+    Create new file metadata entry, sharing the content and vectors of the file content_id if given
+
+    The vectors of a new content are created in the same transaction, so a file is never left without them.
+    """
     db_file = FileMetadata(
         id=file_id,
         filename=filename,
@@ -24,11 +39,19 @@ def create_file_metadata(
         file_metadata=file_metadata,
         categories=categories,
         content=content,
-        user_id=user_id
+        user_id=user_id,
+        content_hash=content_hash,
+        object_name=object_name or file_id,
+        content_id=content_id or file_id,
+        chunker_version=chunker_version,
+        size=size,
+        last_modified=last_modified or datetime.utcnow()
     )
     db.add(db_file)
+    db.add_all(FileEmbedding(file_id=file_id, categories=categories, **v) for v in vectors or [])
     db.commit()
     db.refresh(db_file)
+    get_search_cache().invalidate(user_id)
     return db_file
 
 
@@ -40,6 +63,93 @@ def get_file_metadata(
     return db.query(FileMetadata).filter(FileMetadata.id == file_id).first()
 
 
+async def get_file_with_content_async(
+        db: AsyncSession,
+        file_id: str
+) -> Optional[FileMetadata]:
+    """Get file metadata by ID with its content and Docling metadata, also for duplicates sharing another's"""
+    db_file = await db.get(FileMetadata, file_id)
+    if db_file is not None and db_file.content_id not in (None, db_file.id):
+        source = await db.get(FileMetadata, db_file.content_id)
+        # Detached, so filling in the shared values is never written back
+        db.expunge(db_file)
+        db_file.content = source.content
+        db_file.file_metadata = source.file_metadata
+    return db_file
+
+
+async def get_stored_object_async(
+        db: AsyncSession,
+        file_id: str
+) -> Optional[Row]:
+    """Get the owner, name, type and stored object details of a file, without its content"""
+    return (await db.execute(select(
+        FileMetadata.id,
+        FileMetadata.user_id,
+        FileMetadata.filename,
+        FileMetadata.content_type,
+        FileMetadata.object_name,
+        FileMetadata.content_hash,
+        FileMetadata.size,
+        FileMetadata.last_modified
+    ).where(FileMetadata.id == file_id))).first()
+
+
+def get_files_by_ids(
+        db: Session,
+        file_ids: List[str]
+) -> List[Row]:
+    """Get the id, owner, name, stored object and content row of several files in one query"""
+    return db.execute(select(
+        FileMetadata.id,
+        FileMetadata.user_id,
+        FileMetadata.filename,
+        FileMetadata.object_name,
+        FileMetadata.content_id
+    ).where(FileMetadata.id.in_(file_ids))).all()
+
+
+def get_file_by_hash(
+        db: Session,
+        content_hash: str,
+        user_id: Optional[str] = None
+) -> Optional[FileMetadata]:
+    """Get an ingested file with the given content hash, optionally owned by a specific user"""
+    query = db.query(FileMetadata).filter(FileMetadata.content_hash == content_hash)
+    if user_id is not None:
+        query = query.filter(FileMetadata.user_id == user_id)
+    return query.order_by(FileMetadata.created_at).first()
+
+
+def lock_content_by_hash(
+        db: Session,
+        content_hash: str
+) -> Optional[FileMetadata]:
+    """
+    Get the row holding the content and vectors of the given bytes, if they were ingested
+
+    The row is locked until the transaction ends, which serializes sharing it
+    with the deletion of its last owner.
+    """
+    return db.query(FileMetadata).filter(
+        FileMetadata.content_hash == content_hash,
+        FileMetadata.content_id == FileMetadata.id
+    ).order_by(FileMetadata.created_at).with_for_update().first()
+
+
+def get_files_to_rechunk(
+        db: Session,
+        chunker_version: int
+) -> List[str]:
+    """Get the ids of files indexed by an older chunker, duplicates are re-indexed with the file they share"""
+    return [
+        file_id for file_id, in db.query(FileMetadata.id).filter(
+            FileMetadata.content_id == FileMetadata.id,
+            or_(FileMetadata.chunker_version.is_(None), FileMetadata.chunker_version < chunker_version)
+        )
+    ]
+
+
 def get_user_files(
         db: Session,
         user_id: str
@@ -55,6 +165,94 @@ def get_all_files(
     return db.query(FileMetadata).all()
 
 
+# Sort keys of file listings, files not reconciled yet have no size and sort as the smallest
+FILE_SORT_KEYS = {
+    "last_modified": FileMetadata.last_modified,
+    "filename": FileMetadata.filename,
+    "size": func.coalesce(FileMetadata.size, literal_column("-1")),
+}
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    """The timestamp columns hold naive UTC, aware values are converted and naive ones taken as UTC already"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def list_files_async(
+        db: AsyncSession,
+        user_id: Optional[str],
+        sort: str = "last_modified",
+        descending: bool = True,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, str]] = None,
+        category: Optional[str] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None
+) -> List[Row]:
+    """
+    Get the files of a user, or of every user when user_id is None, without their content
+
+    Files are ordered by the sort key then id. With a limit, a page starts after
+    the (sort key, id) of the last file of the previous one.
+    """
+    sort_key = FILE_SORT_KEYS[sort]
+    query = select(
+        FileMetadata.id,
+        FileMetadata.filename,
+        FileMetadata.content_type,
+        FileMetadata.categories,
+        FileMetadata.size,
+        FileMetadata.last_modified,
+        sort_key.label("sort_key")
+    )
+    if user_id is not None:
+        query = query.where(FileMetadata.user_id == user_id)
+    else:
+        # Rows kept only for the duplicates sharing their content belong to nobody
+        query = query.where(FileMetadata.user_id.isnot(None))
+    if category is not None:
+        query = query.where(FileMetadata.categories.contains([category]))
+    if modified_after is not None:
+        query = query.where(FileMetadata.last_modified >= _naive_utc(modified_after))
+    if modified_before is not None:
+        query = query.where(FileMetadata.last_modified < _naive_utc(modified_before))
+    if after is not None:
+        position = tuple_(sort_key, FileMetadata.id)
+        query = query.where(position < after if descending else position > after)
+
+    if descending:
+        query = query.order_by(sort_key.desc(), FileMetadata.id.desc())
+    else:
+        query = query.order_by(sort_key, FileMetadata.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return list((await db.execute(query)).all())
+
+
+def get_stored_objects(
+        db: Session
+) -> List[Row]:
+    """Get the id, stored object, size and modification time of every file"""
+    return db.execute(select(
+        FileMetadata.id,
+        FileMetadata.object_name,
+        FileMetadata.size,
+        FileMetadata.last_modified
+    )).all()
+
+
+def update_stored_objects(
+        db: Session,
+        changes: List[dict]
+):
+    """Update the size and last_modified of files, given dicts with their id and new values"""
+    if changes:
+        db.execute(update(FileMetadata), changes)
+        db.commit()
+
+
 def update_file_metadata(
         db: Session,
         file_id: str,
@@ -69,8 +267,11 @@ def update_file_metadata(
         db_file.content = content
         db_file.categories = categories
         db_file.updated_at = datetime.utcnow()
+        # Keep the categories copied onto the vectors in sync
+        db.query(FileEmbedding).filter(FileEmbedding.file_id == file_id).update({"categories": categories})
         db.commit()
         db.refresh(db_file)
+        get_search_cache().invalidate(db_file.user_id)
     return db_file
 
 
@@ -83,6 +284,7 @@ def delete_file_metadata(
     if db_file:
         db.delete(db_file)
         db.commit()
+        get_search_cache().invalidate(db_file.user_id)
         return True
     return False
 
@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models.job import IngestionJob
+
+
+def create_job(
+        db: Session,
+        file_id: str,
+        filename: str,
+        content_type: str,
+        user_id: str,
+        content_hash: Optional[str],
+        max_attempts: int,
+        kind: str = "ingest",
+        size: Optional[int] = None,
+        last_modified: Optional[datetime] = None
+) -> IngestionJob:
+    """Queue a new ingestion job for an uploaded file"""
+    db_job = IngestionJob(
+        kind=kind,
+        file_id=file_id,
+        filename=filename,
+        content_type=content_type,
+        user_id=user_id,
+        content_hash=content_hash,
+        size=size,
+        last_modified=last_modified,
+        max_attempts=max_attempts
+    )
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job(
+        db: Session,
+        job_id: str
+) -> Optional[IngestionJob]:
+    """Get ingestion job by ID"""
+    return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+
+def has_active_job(
+        db: Session,
+        file_id: str,
+        kind: str
+) -> bool:
+    """Check if a job of this kind is queued or running for the file"""
+    return db.query(IngestionJob.id).filter(
+        IngestionJob.file_id == file_id,
+        IngestionJob.kind == kind,
+        IngestionJob.status.in_(("queued", "running"))
+    ).first() is not None
+
+
+def get_pending_file_ids(
+        db: Session
+) -> set[str]:
+    """Get the ids of the files of queued or running jobs, whose objects are stored but not indexed yet"""
+    return {
+        file_id for file_id, in db.query(IngestionJob.file_id).filter(IngestionJob.status.in_(("queued", "running")))
+    }
+
+
+def claim_next_job(
+        db: Session,
+        worker_id: str,
+        lease_seconds: int
+) -> Optional[IngestionJob]:
+    """
+    Lock the oldest runnable job for this worker.
+
+    A job is runnable when it is queued and due, or when it is marked as running
+    but its lease expired (the worker holding it died), so it is resumed here.
+    """
+    now = datetime.utcnow()
+    db_job = (
+        db.query(IngestionJob)
+        .filter(or_(
+            and_(IngestionJob.status == "queued", IngestionJob.available_at <= now),
+            and_(IngestionJob.status == "running", IngestionJob.locked_until < now)
+        ))
+        .order_by(IngestionJob.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if db_job is None:
+        db.rollback()
+        return None
+
+    if db_job.attempts >= db_job.max_attempts:
+        db_job.status = "failed"
+        db_job.error = db_job.error or "Worker lost the job too many times"
+        db_job.locked_by = None
+        db_job.locked_until = None
+        db.commit()
+        return claim_next_job(db, worker_id, lease_seconds)
+
+    db_job.status = "running"
+    db_job.attempts += 1
+    db_job.locked_by = worker_id
+    db_job.locked_until = now + timedelta(seconds=lease_seconds)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+class LeaseLostError(Exception):
+    """The job lease expired and another worker claimed the job"""
+
+
+def _held_job(
+        db: Session,
+        job_id: str,
+        worker_id: str
+) -> Optional[IngestionJob]:
+    """Lock a job if this worker still holds its lease, None once another worker claimed it"""
+    db_job = (
+        db.query(IngestionJob)
+        .filter(
+            IngestionJob.id == job_id,
+            IngestionJob.status == "running",
+            IngestionJob.locked_by == worker_id
+        )
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+    if db_job is None:
+        db.rollback()
+    return db_job
+
+
+def renew_lease(
+        db: Session,
+        job_id: str,
+        worker_id: str,
+        lease_seconds: int
+) -> bool:
+    """Extend the lease of a job while a stage runs, returns False once the worker lost it"""
+    db_job = _held_job(db, job_id, worker_id)
+    if db_job is None:
+        return False
+    db_job.locked_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    db.commit()
+    return True
+
+
+def update_job_stage(
+        db: Session,
+        db_job: IngestionJob,
+        worker_id: str,
+        stage: str,
+        lease_seconds: int
+) -> IngestionJob:
+    """Record stage progress and extend the job lease, raises LeaseLostError once the worker lost it"""
+    if _held_job(db, db_job.id, worker_id) is None:
+        raise LeaseLostError(f"Job {db_job.id} was claimed by another worker")
+    db_job.stage = stage
+    db_job.locked_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def complete_job(
+        db: Session,
+        db_job: IngestionJob,
+        worker_id: str,
+        file_id: Optional[str] = None
+) -> bool:
+    """Mark a job as succeeded, optionally with the file it resolved to, returns False once the worker lost it"""
+    if _held_job(db, db_job.id, worker_id) is None:
+        return False
+    if file_id is not None:
+        db_job.file_id = file_id
+    db_job.status = "succeeded"
+    db_job.stage = "done"
+    db_job.error = None
+    db_job.locked_by = None
+    db_job.locked_until = None
+    db.commit()
+    db.refresh(db_job)
+    return True
+
+
+def fail_job(
+        db: Session,
+        db_job: IngestionJob,
+        worker_id: str,
+        error: str,
+        retry_backoff_seconds: int
+) -> bool:
+    """Record a failed attempt, requeueing the job while attempts remain, returns False once the worker lost it"""
+    if _held_job(db, db_job.id, worker_id) is None:
+        return False
+    db_job.error = error
+    db_job.locked_by = None
+    db_job.locked_until = None
+    if db_job.attempts < db_job.max_attempts:
+        db_job.status = "queued"
+        db_job.available_at = datetime.utcnow() + timedelta(seconds=retry_backoff_seconds * db_job.attempts)
+    else:
+        db_job.status = "failed"
+    db.commit()
+    db.refresh(db_job)
+    return True
@@ -1,88 +1,354 @@
-from typing import Dict
-
-from sqlalchemy import select, and_, or_, not_, text
-from sqlalchemy.orm import Session
+from typing import Dict, Optional
 
+from sqlalchemy import select, and_, or_, not_, text, func, case, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 
+from core.config import get_settings
 from models.file import FileEmbedding, FileMetadata
+from services.queryParser import parse_query, Node, Term, Not, And
+from services.searchCache import get_search_cache
+
+settings = get_settings()
 
-keyword_to_sql = {
-    'AND': 'AND',
-    'OR': 'OR',
-    '&&': 'AND',
-    '||': 'OR'
-}
+# Row holding the content, search vector and vectors of a file, another one for duplicate uploads
+ContentRow = aliased(FileMetadata, name="content_row")
 
 
-def create_vector_entries(db: Session, vectors, file_id: str):
-    """Create new vector entries"""
-    db_vectors = map(lambda v: FileEmbedding(file_id=file_id, **v), vectors)
-    db.add_all(db_vectors)
+def replace_vector_entries(db: Session, vectors, file_id: str, chunker_version: int):
+    """Replace the vector entries of a file in a single transaction"""
+    db_file = db.query(FileMetadata).filter(FileMetadata.id == file_id).first()
+    db.query(FileEmbedding).filter(FileEmbedding.file_id == file_id).delete()
+    db.add_all(map(
+        lambda v: FileEmbedding(file_id=file_id, categories=db_file.categories, **v),
+        vectors
+    ))
+    db_file.chunker_version = chunker_version
     db.commit()
+    # Every file sharing the vectors sees the new ones
+    for user_id, in db.query(FileMetadata.user_id).filter(FileMetadata.content_id == file_id).distinct():
+        get_search_cache().invalidate(user_id)
+
+
+def distance_to(query_vector):
+    """Distance to the query for the configured metric, the one the ANN index is built for"""
+    if settings.VECTOR_DISTANCE == "l2":
+        return FileEmbedding.embedding.l2_distance(query_vector)
+    if settings.VECTOR_DISTANCE == "inner_product":
+        return FileEmbedding.embedding.max_inner_product(query_vector)
+    return FileEmbedding.embedding.cosine_distance(query_vector)
+
+
+def distance_cutoff(distance) -> list:
+    """
+    Filters dropping chunks too far from the query to be relevant.
+
+    VECTOR_MAX_DISTANCE is a cosine distance, bounded to [0, 2]. L2 distances
+    and negated inner products depend on the scale of the vectors, so they are
+    ranked without a cutoff.
+    """
+    if settings.VECTOR_DISTANCE == "cosine":
+        return [distance < settings.VECTOR_MAX_DISTANCE]
+    return []
+
+
+def similarity_from_distance(distance: float) -> float:
+    """Turn a distance of the configured metric into a score where higher is more similar"""
+    if settings.VECTOR_DISTANCE == "l2":
+        return 1.0 / (1.0 + distance)
+    if settings.VECTOR_DISTANCE == "inner_product":
+        return -distance
+    return 1.0 - distance
+
 
+async def set_search_params(db: AsyncSession, ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """Tune the ANN index scan for the rest of the current transaction"""
+    if settings.VECTOR_INDEX_TYPE == "hnsw":
+        await db.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"),
+                         {"value": str(ef_search or settings.HNSW_EF_SEARCH)})
+        if settings.HNSW_ITERATIVE_SCAN:
+            await db.execute(text("SELECT set_config('hnsw.iterative_scan', :value, true)"),
+                             {"value": settings.HNSW_ITERATIVE_SCAN})
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        await db.execute(text("SELECT set_config('ivfflat.probes', :value, true)"),
+                         {"value": str(probes or settings.IVFFLAT_PROBES)})
 
-def parse(q, depth=0):
-    if not q:
-        return None, dict()
 
-    for i in range(1, len(q)):
-        for key in keyword_to_sql:
-            if q[:i].endswith(key):
-                keyword = keyword_to_sql[key]
-                if keyword == "AND":
-                    prev_word = text(f"file_metadata.content ILIKE :filter_{depth}")
-                    next_word, next_params = parse(q[i:].strip(), depth=depth + 1)
-                    return and_(prev_word, next_word), next_params | {f"filter_{depth}": f"%{q[:i - len(key)].strip()}%"}
+def _like_pattern(value: str) -> str:
+    escaped = value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
 
-                elif keyword == "OR":
-                    prev_word = text(f"file_metadata.content ILIKE :filter_{depth}")
-                    next_word, next_params = parse(q[i:].strip(), depth=depth + 1)
-                    return or_(prev_word, next_word), next_params | {f"filter_{depth}": f"%{q[:i - len(key)].strip()}%"}
 
-    return text(f"file_metadata.content ILIKE :filter_{depth}"), {f"filter_{depth}": f"%{q.strip()}%"}
+def _compile_term(term: Term):
+    if term.field == "filename":
+        # Served by the pg_trgm index on filename
+        return FileMetadata.filename.ilike(_like_pattern(term.value), escape="!")
+    if term.field == "category":
+        # Served by the GIN index on categories
+        return FileMetadata.categories.contains([term.value])
 
+    if term.phrase:
+        tsquery = func.phraseto_tsquery("english", term.value)
+    elif term.prefix:
+        lexeme = term.value.replace("\\", "\\\\").replace("'", "''")
+        tsquery = func.to_tsquery("english", f"'{lexeme}':*")
+    else:
+        tsquery = func.plainto_tsquery("english", term.value)
+    return ContentRow.search_vector.op("@@")(tsquery)
 
-def search_by_vector(db: Session, query_vector, query_text: str):
+
+def compile_filters(node: Node):
+    """
+    Compile a parsed filter query to SQL predicates served by the full-text, trigram and category indexes
+
+    Names and categories are those of the file in FileMetadata, the text is matched against its content in ContentRow.
+    """
+    if isinstance(node, Term):
+        return _compile_term(node)
+    if isinstance(node, Not):
+        return not_(func.coalesce(compile_filters(node.operand), False))
+    if isinstance(node, And):
+        return and_(*map(compile_filters, node.operands))
+    return or_(*map(compile_filters, node.operands))
+
+
+async def search_by_vector(db: AsyncSession, query_vector, query_text: str, user_id: str,
+                           category: Optional[str] = None, ef_search: Optional[int] = None,
+                           probes: Optional[int] = None, context_range: int = 400):
     """
     Search for documents using vector similarity and text-based filters.
 
     Args:
-        db: SQLAlchemy database session
+        db: SQLAlchemy async database session
         query_vector: Vector to compare against document embeddings
-        query_text: Text query containing keywords for filtering
+        query_text: Filter query in the language of services.queryParser, e.g. `report AND NOT category:Physics`
+        user_id: Owner of the documents to search
+        category: Optional category the documents must have
+        ef_search: HNSW candidate list size, defaults to HNSW_EF_SEARCH
+        probes: IVFFlat lists to probe, defaults to IVFFLAT_PROBES
+        context_range: Characters of content to return around each matching chunk
 
     Returns:
-        List of results containing embeddings, metadata, and distance scores
+        Rows with the file fields, chunk positions, distance and a `window` of the
+        content starting at `window_start`, cut in Postgres so the content and
+        embeddings never leave the database
     """
 
-    # Build text-based filter conditions and collect parameters
-    query_parsed, params = parse(query_text)
-    print(type(query_parsed))
+    # Build text-based filter conditions, raises QuerySyntaxError for malformed filters
+    query_parsed = parse_query(query_text)
 
-    # Combine all filter conditions
-    combined_filters = and_(
-        FileEmbedding.embedding.cosine_distance(query_vector) < 0.5,
-        query_parsed
-    ) if query_parsed is not None else FileEmbedding.embedding.cosine_distance(query_vector) < 0.5
+    distance = distance_to(query_vector)
 
-    # Build and execute query
+    # Combine all filter conditions, the category is denormalized on the vectors
+    filters = distance_cutoff(distance)
+    if category:
+        filters.append(FileEmbedding.categories.any(category))
+    if query_parsed is not None:
+        filters.append(compile_filters(query_parsed))
+
+    window_start = func.greatest(FileEmbedding.start_position - context_range, 0)
+    # One character past the range tells whether the window was cut before the end of the content
+    window_end = FileEmbedding.end_position + context_range + 1
+
+    # Build and execute query, ordering by the indexed distance so the ANN index is used. The vectors
+    # are those of the content row, and the user's file sharing it gives the owner and name
     query = (
-        select(FileEmbedding, FileMetadata, FileEmbedding.embedding.cosine_distance(query_vector).label('distance'))
-        .join(FileMetadata, FileMetadata.id == FileEmbedding.file_id)
-        .filter(combined_filters)
-        .order_by(FileEmbedding.embedding.cosine_distance(query_vector))
+        select(
+            FileMetadata.id.label('file_id'),
+            FileEmbedding.start_position,
+            FileEmbedding.end_position,
+            FileMetadata.filename,
+            FileMetadata.content_type,
+            FileMetadata.categories,
+            distance.label('distance'),
+            window_start.label('window_start'),
+            func.substring(ContentRow.content, window_start + 1, window_end - window_start).label('window')
+        )
+        .select_from(FileEmbedding)
+        .join(FileMetadata, and_(FileMetadata.content_id == FileEmbedding.file_id, FileMetadata.user_id == user_id))
+        .join(ContentRow, ContentRow.id == FileEmbedding.file_id)
+        .filter(*filters)
+        .order_by(distance)
         .limit(10)
     )
 
-    # Execute query with parameters
-    print(query)
-    results = db.execute(query, params).all()
+    await set_search_params(db, ef_search, probes)
+    results = (await db.execute(query)).all()
     return results
 
 
-def delete_file(db: Session, file_id: str):
-    """Delete file metadata and embeddings"""
-    db.query(FileEmbedding).filter(FileEmbedding.file_id == file_id).delete()
-    db.query(FileMetadata).filter(FileMetadata.id == file_id).delete()
+async def hybrid_search(db: AsyncSession, query: str, query_vector, user_id: str, category: Optional[str] = None,
+                        limit: int = 10, lexical_candidates: int = None, vector_candidates: int = None,
+                        lexical_weight: float = None, vector_weight: float = None,
+                        ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """
+    Rank a user's documents by both full-text relevance and vector similarity in one query.
+
+    The lexical and vector candidate lists are ranked in their own CTEs and
+    fused with weighted reciprocal-rank fusion: score = sum(weight / (k + rank)).
+    A document found by only one of them keeps that list's contribution.
+
+    Returns:
+        Rows with the file fields, score, the rank in each list (None when absent)
+        and a preview, highlighted fragments for lexical hits, the best chunk otherwise
+    """
+    lexical_candidates = lexical_candidates or settings.HYBRID_LEXICAL_CANDIDATES
+    vector_candidates = vector_candidates or settings.HYBRID_VECTOR_CANDIDATES
+    lexical_weight = settings.HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    vector_weight = settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+    rrf_k = settings.HYBRID_RRF_K
+
+    tsquery = func.plainto_tsquery("english", query)
+    text_rank = func.ts_rank(ContentRow.search_vector, tsquery)
+    lexical_filters = [FileMetadata.user_id == user_id, ContentRow.search_vector.op("@@")(tsquery)]
+    if category:
+        lexical_filters.append(FileMetadata.categories.contains([category]))
+    lexical = (
+        select(
+            FileMetadata.id.label("file_id"),
+            func.row_number().over(order_by=(text_rank.desc(), FileMetadata.id)).label("rank")
+        )
+        .join(ContentRow, ContentRow.id == FileMetadata.content_id)
+        .where(*lexical_filters)
+        .order_by(text_rank.desc(), FileMetadata.id)
+        .limit(lexical_candidates)
+        .cte("lexical")
+    )
+
+    # Nearest chunks first, through the ANN index, then collapsed to the best chunk of each file
+    distance = distance_to(query_vector)
+    chunk_filters = distance_cutoff(distance)
+    if category:
+        chunk_filters.append(FileEmbedding.categories.any(category))
+    chunks = (
+        select(
+            FileMetadata.id.label("file_id"),
+            FileEmbedding.start_position,
+            FileEmbedding.end_position,
+            distance.label("distance")
+        )
+        .select_from(FileEmbedding)
+        .join(FileMetadata, and_(FileMetadata.content_id == FileEmbedding.file_id, FileMetadata.user_id == user_id))
+        .where(*chunk_filters)
+        .order_by(distance)
+        .limit(vector_candidates)
+        .cte("chunks")
+    )
+    best_chunks = (
+        select(
+            chunks,
+            func.row_number().over(partition_by=chunks.c.file_id, order_by=chunks.c.distance).label("chunk_rank")
+        )
+        .cte("best_chunks")
+    )
+    semantic = (
+        select(
+            best_chunks.c.file_id,
+            best_chunks.c.start_position,
+            best_chunks.c.end_position,
+            best_chunks.c.distance,
+            func.row_number().over(order_by=best_chunks.c.distance).label("rank")
+        )
+        .where(best_chunks.c.chunk_rank == 1)
+        .cte("semantic")
+    )
+
+    score = (
+        func.coalesce(lexical_weight / (rrf_k + lexical.c.rank), 0.0)
+        + func.coalesce(vector_weight / (rrf_k + semantic.c.rank), 0.0)
+    )
+    fused = (
+        select(
+            func.coalesce(lexical.c.file_id, semantic.c.file_id).label("file_id"),
+            score.label("score"),
+            lexical.c.rank.label("lexical_rank"),
+            semantic.c.rank.label("vector_rank"),
+            semantic.c.start_position,
+            semantic.c.end_position
+        )
+        .select_from(lexical.join(semantic, lexical.c.file_id == semantic.c.file_id, full=True))
+        .order_by(score.desc())
+        .limit(limit)
+        .cte("fused")
+        .prefix_with("MATERIALIZED", dialect="postgresql")
+    )
+
+    # Previews are only computed for the fused page
+    preview = case(
+        (fused.c.lexical_rank.isnot(None), func.ts_headline(
+            "english", ContentRow.content, tsquery,
+            "StartSel = <mark>, StopSel = </mark>, MaxFragments = 3, MaxWords = 35, MinWords = 15"
+        )),
+        else_=func.substring(
+            ContentRow.content,
+            fused.c.start_position + 1,
+            fused.c.end_position - fused.c.start_position
+        )
+    )
+    statement = (
+        select(
+            FileMetadata.id.label("file_id"),
+            FileMetadata.filename,
+            FileMetadata.content_type,
+            FileMetadata.categories,
+            fused.c.score,
+            fused.c.lexical_rank,
+            fused.c.vector_rank,
+            preview.label("content_preview")
+        )
+        .join(fused, fused.c.file_id == FileMetadata.id)
+        .join(ContentRow, ContentRow.id == FileMetadata.content_id)
+        .order_by(fused.c.score.desc())
+    )
+
+    # HNSW only returns up to ef_search rows, it must cover the candidate pool
+    await set_search_params(db, max(ef_search or settings.HNSW_EF_SEARCH, vector_candidates), probes)
+    return (await db.execute(statement)).all()
+
+
+def delete_files(db: Session, files) -> list[str]:
+    """
+    Delete several files in a single transaction
+
+    Takes rows with the id, user_id, object_name and content_id of each file.
+    A file whose content and vectors other files still share only loses its
+    owner; content rows nobody shares anymore are deleted with their vectors.
+    Returns the stored objects no remaining file refers to, which can be removed.
+    """
+    file_ids = [file.id for file in files]
+    content_ids = {file.content_id for file in files}
+    object_names = {file.object_name for file in files}
+
+    # Sharing content takes the same lock, so no new duplicate can claim these contents or objects
+    # between the checks below and the commit
+    db.query(FileMetadata.id).filter(
+        FileMetadata.content_id == FileMetadata.id,
+        or_(FileMetadata.id.in_(content_ids), FileMetadata.object_name.in_(object_names))
+    ).with_for_update().all()
+
+    db.query(FileMetadata).filter(
+        FileMetadata.id.in_(file_ids), FileMetadata.content_id != FileMetadata.id
+    ).delete(synchronize_session=False)
+    db.query(FileMetadata).filter(
+        FileMetadata.id.in_(file_ids), FileMetadata.content_id == FileMetadata.id
+    ).update({"user_id": None}, synchronize_session=False)
+
+    sharing = aliased(FileMetadata)
+    unshared = [
+        content_id for content_id, in db.query(FileMetadata.id).filter(
+            FileMetadata.id.in_(content_ids),
+            FileMetadata.user_id.is_(None),
+            ~exists().where(sharing.content_id == FileMetadata.id, sharing.id != FileMetadata.id)
+        )
+    ]
+    db.query(FileEmbedding).filter(FileEmbedding.file_id.in_(unshared)).delete(synchronize_session=False)
+    db.query(FileMetadata).filter(FileMetadata.id.in_(unshared)).delete(synchronize_session=False)
+
+    in_use = {
+        object_name for object_name, in
+        db.query(FileMetadata.object_name).filter(FileMetadata.object_name.in_(object_names)).distinct()
+    }
     db.commit()
-    return True
+    for user_id in {file.user_id for file in files}:
+        get_search_cache().invalidate(user_id)
+    return sorted(object_names - in_use)
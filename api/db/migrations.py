@@ -0,0 +1,253 @@
+import time
+
+from sqlalchemy import text
+
+from core.config import get_settings
+from db.database import engine
+
+settings = get_settings()
+
+# pgvector operator class matching each distance metric, an index is only used by queries ordering by its metric
+VECTOR_OPERATOR_CLASSES = {
+    "cosine": "vector_cosine_ops",
+    "l2": "vector_l2_ops",
+    "inner_product": "vector_ip_ops",
+}
+
+# Advisory lock keys, so processes starting together run the migrations and index builds once
+MIGRATION_LOCK = 7_402_113_001
+INDEX_BUILD_LOCK = 7_402_113_002
+
+# Idempotent statements bringing tables created by older versions up to date,
+# create_all only creates missing tables
+MIGRATIONS = [
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS object_name VARCHAR",
+    "UPDATE file_metadata SET object_name = id WHERE object_name IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_content_hash ON file_metadata (content_hash)",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS chunker_version INTEGER",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR DEFAULT 'ingest'",
+    "ALTER TABLE file_embeddings ADD COLUMN IF NOT EXISTS categories TEXT[]",
+    """
+    UPDATE file_embeddings fe SET categories = fm.categories
+    FROM file_metadata fm
+    WHERE fe.file_id = fm.id AND fe.categories IS NULL AND fm.categories IS NOT NULL
+    """,
+    # Owners of shared vectors are found through file_metadata.content_id, the uploader copied on them is unused
+    "DROP INDEX IF EXISTS ix_file_embeddings_user_id",
+    "ALTER TABLE file_embeddings DROP COLUMN IF EXISTS user_id",
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+    r"""
+    CREATE OR REPLACE FUNCTION file_metadata_search_vector(filename TEXT, content TEXT) RETURNS TSVECTOR AS $$
+        SELECT setweight(to_tsvector('english', coalesce(filename, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(
+                (SELECT string_agg(heading[1], ' ') FROM regexp_matches(content, '^#{1,6}\s+(.*)$', 'gn') AS heading),
+                ''
+            )), 'B')
+            || setweight(to_tsvector('english', coalesce(content, '')), 'D')
+    $$ LANGUAGE SQL IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION file_metadata_search_vector_update() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.search_vector := file_metadata_search_vector(NEW.filename, NEW.content);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS file_metadata_search_vector_update ON file_metadata",
+    """
+    CREATE TRIGGER file_metadata_search_vector_update
+    BEFORE INSERT OR UPDATE OF filename, content ON file_metadata
+    FOR EACH ROW EXECUTE FUNCTION file_metadata_search_vector_update()
+    """,
+    # Indexes for the filename: and category: qualifiers of the filter query language
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_categories ON file_metadata USING gin (categories)",
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS ix_file_metadata_filename_trgm ON file_metadata USING gin (filename gin_trgm_ops);
+        END IF;
+    END
+    $$
+    """,
+    # Stored object details served by file listings, sizes of older rows are filled in by the reconciliation job
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS size BIGINT",
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS last_modified TIMESTAMP",
+    "UPDATE file_metadata SET last_modified = created_at WHERE last_modified IS NULL",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS size BIGINT",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS last_modified TIMESTAMP",
+    # One index per sort key of the file listing, so every page is an index range scan
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_user_last_modified ON file_metadata (user_id, last_modified, id)",
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_user_filename ON file_metadata (user_id, filename, id)",
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_user_size ON file_metadata (user_id, coalesce(size, -1), id)",
+    # Duplicate uploads share the content and vectors of the row named by content_id instead of copying them
+    "ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS content_id VARCHAR",
+    "UPDATE file_metadata SET content_id = id WHERE content_id IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_user_content ON file_metadata (user_id, content_id)",
+    "CREATE INDEX IF NOT EXISTS ix_file_metadata_content_id ON file_metadata (content_id)",
+]
+
+
+def run_migrations():
+    """Apply schema changes to existing tables, one process at a time"""
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK})
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
+
+
+def _being_built(connection, name: str) -> bool:
+    """Whether a CREATE INDEX of that index is in progress, an invalid index may be another process's build"""
+    return connection.execute(text("""
+        SELECT 1
+        FROM pg_stat_progress_create_index p
+        JOIN pg_class c ON c.oid = p.index_relid
+        WHERE c.relname = :name
+    """), {"name": name}).first() is not None
+
+
+def build_indexes() -> bool:
+    """
+    Build the indexes created CONCURRENTLY, returns False when another process is already building them.
+
+    An HNSW build over a large table can take hours, so this runs in a
+    background thread at startup or explicitly with `python -m db.migrations`.
+    """
+    # Autocommit, a transaction left open would hold a snapshot the concurrent builds wait for
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEX_BUILD_LOCK}).scalar():
+            return False
+        try:
+            ensure_vector_index()
+            drop_tenant_indexes()
+            ensure_search_index()
+            ensure_file_id_index()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_BUILD_LOCK})
+    return True
+
+
+def ensure_vector_index():
+    """
+    Create the configured ANN index on file_embeddings and drop any other one.
+
+    Indexes are built and dropped CONCURRENTLY, so searches and ingestion keep
+    running meanwhile. IVFFlat lists are computed from the rows present when the
+    index is built, so it should be created once the table has data.
+    """
+    index_type = settings.VECTOR_INDEX_TYPE
+    operator_class = VECTOR_OPERATOR_CLASSES[settings.VECTOR_DISTANCE]
+    name = f"ix_file_embeddings_ann_{index_type}_{settings.VECTOR_DISTANCE}"
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        existing = connection.execute(text("""
+            SELECT c.relname AS name, i.indisvalid AS valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_class t ON t.oid = i.indrelid
+            WHERE t.relname = 'file_embeddings' AND c.relname LIKE 'ix_file_embeddings_ann_%'
+        """)).all()
+
+        # Drop indexes of another type or metric, and builds left invalid by an interrupted run
+        building = False
+        for index in existing:
+            if _being_built(connection, index.name):
+                building = building or index.name == name
+            elif index.name != name or not index.valid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+
+        if index_type == "none" or building or any(index.name == name and index.valid for index in existing):
+            return
+
+        if index_type == "hnsw":
+            options = f"m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION}"
+        elif index_type == "ivfflat":
+            options = f"lists = {settings.IVFFLAT_LISTS}"
+        else:
+            raise ValueError(f"Unknown vector index type {index_type}")
+
+        connection.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON file_embeddings USING {index_type} (embedding {operator_class}) WITH ({options})'
+        ))
+
+
+def drop_tenant_indexes():
+    """
+    Drop the per-user partial HNSW indexes of older versions.
+
+    Searches find a user's vectors through file_metadata.content_id since
+    duplicate uploads share them, never by a user_id predicate the partial
+    indexes could match, so they were only maintenance cost.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        existing = connection.execute(text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE tablename = 'file_embeddings' AND indexname LIKE 'ix_file_embeddings_tenant_%'"
+        )).scalars().all()
+        for name in existing:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+
+def _ensure_index_concurrently(name: str, definition: str):
+    """Build an index CONCURRENTLY, so writes go on meanwhile, rebuilding it if a previous build was interrupted"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        valid = connection.execute(text("""
+            SELECT i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name
+        """), {"name": name}).scalar()
+        if valid or (valid is not None and _being_built(connection, name)):
+            return
+        if valid is not None:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        connection.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {definition}'))
+
+
+def ensure_search_index():
+    """Build the GIN index on file_metadata.search_vector"""
+    _ensure_index_concurrently("ix_file_metadata_search_vector", "file_metadata USING gin (search_vector)")
+
+
+def ensure_file_id_index():
+    """Build the index on file_embeddings.file_id, so deleting or copying the vectors of a file does not scan them all"""
+    _ensure_index_concurrently("ix_file_embeddings_file_id", "file_embeddings (file_id)")
+
+
+def backfill_search_vectors(batch_size: int = None, pause: float = None) -> int:
+    """
+    Fill search_vector for rows written before the trigger existed, returns how many were updated.
+
+    Rows are updated in small batches, each in its own transaction, skipping
+    rows locked by writers, so the table stays available while it runs.
+    """
+    batch_size = batch_size or settings.SEARCH_BACKFILL_BATCH_SIZE
+    pause = settings.SEARCH_BACKFILL_PAUSE_SECONDS if pause is None else pause
+    updated = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text("""
+                UPDATE file_metadata fm
+                SET search_vector = file_metadata_search_vector(fm.filename, fm.content)
+                WHERE fm.id IN (
+                    SELECT id FROM file_metadata
+                    WHERE search_vector IS NULL
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+            """), {"batch_size": batch_size}).rowcount
+        updated += rows
+        if rows < batch_size:
+            return updated
+        time.sleep(pause)
+
+
+if __name__ == "__main__":
+    run_migrations()
+    if not build_indexes():
+        print("Indexes are being built by another process")
+    print(f"Search vectors backfilled: {backfill_search_vectors()}")
@@ -1,12 +1,17 @@
+import threading
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.config import get_settings
 from core.minio import init_minio
-from db.database import engine
+from core.registry import model_registry
+from db.database import engine, async_engine
+from db.migrations import run_migrations, build_indexes, backfill_search_vectors
 from models.file import Base
-from routers import auth, file, search, categories, chat
+from routers import auth, file, search, categories, chat, jobs, metrics
+from services.executors import shutdown_executors
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +34,14 @@ tags_metadata = [
     {
         "name": "Categories",
         "description": "Operations related to categories"
+    },
+    {
+        "name": "Jobs",
+        "description": "Progress of background ingestion jobs"
+    },
+    {
+        "name": "Metrics",
+        "description": "Runtime metrics, for administrators"
     }
 ]
 
@@ -48,15 +61,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Accept-Ranges", "Content-Range", "Content-Disposition", "ETag", "Last-Modified"],
 )
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+run_migrations()
 
 init_minio()
 
+
+@app.on_event("startup")
+def start_background_workers():
+    model_registry.warm_up(settings.WARMUP_MODELS)
+    file.ingestion_service.start()
+    file.reconciliation_service.start()
+    # Queries work without the indexes meanwhile, only slower
+    threading.Thread(target=build_indexes, name="index-build", daemon=True).start()
+    threading.Thread(target=backfill_search_vectors, name="search-backfill", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    file.ingestion_service.stop()
+    file.reconciliation_service.stop()
+    file.document_service.shutdown()
+    shutdown_executors()
+
+
+@app.on_event("shutdown")
+async def close_database():
+    await async_engine.dispose()
+
+
 app.include_router(prefix="/api", router=auth.router)
 app.include_router(prefix="/api", router=file.router)
 app.include_router(prefix="/api", router=search.router)
 app.include_router(prefix="/api", router=categories.router)
 app.include_router(prefix="/api", router=chat.router)
+app.include_router(prefix="/api", router=jobs.router)
+app.include_router(prefix="/api", router=metrics.router)
@@ -1,7 +1,9 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, String, JSON, DateTime, ForeignKey, Integer, ARRAY, Text
+from sqlalchemy import Column, String, JSON, DateTime, ForeignKey, Integer, Text, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
 from pgvector.sqlalchemy import Vector
 
 from db.database import Base
@@ -17,6 +19,18 @@ class FileMetadata(Base):
     content = Column(String)
     user_id = Column(String)
     categories = Column(ARRAY(Text))
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded bytes
+    object_name = Column(String)  # MinIO object holding the bytes, shared by duplicate uploads
+    # Row holding the content and vectors, its own id except for duplicate uploads, which share those of the
+    # first upload of the bytes. A row whose owner deleted it while duplicates still share it has no user_id
+    content_id = Column(String)
+    chunker_version = Column(Integer)  # NULL for documents indexed one line per vector
+    # Size and modification time of the stored object, so listings never have to ask MinIO
+    size = Column(BigInteger)
+    last_modified = Column(DateTime, default=datetime.utcnow)
+    # Weighted filename (A), headings (B) and body (D), kept up to date by a trigger on write. Only queried
+    # in SQL, so never loaded with the row
+    search_vector = deferred(Column(TSVECTOR))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -25,7 +39,9 @@ class FileEmbedding(Base):
     __tablename__ = "file_embeddings"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    file_id = Column(String, ForeignKey("file_metadata.id"))
+    file_id = Column(String, ForeignKey("file_metadata.id"), index=True)
+    # Copied from file_metadata so vector search filters categories without a join
+    categories = Column(ARRAY(Text))
     embedding = Column(Vector(384))
     start_position = Column(Integer)
     end_position = Column(Integer)
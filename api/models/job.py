@@ -0,0 +1,30 @@
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import Column, String, DateTime, Integer, Text, BigInteger
+
+from db.database import Base
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: uuid4().hex)
+    kind = Column(String, default="ingest")  # ingest, rechunk
+    file_id = Column(String, index=True)
+    filename = Column(String)
+    content_type = Column(String)
+    user_id = Column(String, index=True)
+    content_hash = Column(String)
+    size = Column(BigInteger)
+    last_modified = Column(DateTime)  # Of the stored object
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    stage = Column(String, default="stored")  # stored, converting, embedding, classifying, persisting, done
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text)
+    locked_by = Column(String)
+    locked_until = Column(DateTime)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
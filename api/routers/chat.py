@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, Security
-from db.database import get_db
+from db.database import get_async_db
 from core.security import get_current_user
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.auth import User
 
 from services.chat import RAGPipeline
@@ -14,9 +14,9 @@ rag_pipeline = RAGPipeline("services/model.gguf")
 async def chat(
         question: str,
         user: User = Security(get_current_user, scopes=["file:write"]),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    response_stream = rag_pipeline.query_documents(db, question, user.sub)
+    response_stream = await rag_pipeline.query_documents(db, question, user.sub)
 
     return EventSourceResponse(response_stream, media_type="text/event-stream")
 
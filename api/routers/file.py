@@ -1,96 +1,199 @@
-import io
+import asyncio
+import base64
+import json
 import uuid
-from typing import List
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Literal, Optional
+from urllib.parse import quote
 
-import requests
 from fastapi import APIRouter
-from fastapi import HTTPException, UploadFile, File, Depends, Security
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, UploadFile, File, Depends, Security, Query, Response, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, RedirectResponse
 from minio.error import S3Error
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from core.config import get_settings
 from core.security import get_current_user
 from crud import file as file_crud
 from crud import vectorSearch as vector_search_crud
-from db.database import get_db
+from db.database import get_db, get_async_db
 from schemas.auth import User
-from schemas.file import FileInfo
+from schemas.file import FileInfo, FileMetadataResponse, BulkDeleteRequest
 from services.categories import CategoryService
+from services.chunker import CHUNKER_VERSION
 from services.minio import MinioService
 from services.docling import DocumentService
+from services.executors import get_executor
+from services.ingestion import IngestionService
+from services.reconciliation import ReconciliationService
 from services.vectorSearch import VectorSearchService
 
+settings = get_settings()
+
 minio_service = MinioService()
 document_service = DocumentService()
 vector_search_service = VectorSearchService()
 categories_service = CategoryService()
+ingestion_service = IngestionService(minio_service, document_service, categories_service, vector_search_service)
+reconciliation_service = ReconciliationService(minio_service)
 
 router = APIRouter(tags=['File Management'])
 
 
-@router.post("/upload/", status_code=201)
+def _encode_cursor(row, sort: str, descending: bool) -> str:
+    """Opaque cursor pointing after a listed file"""
+    key = row.sort_key.isoformat() if isinstance(row.sort_key, datetime) else row.sort_key
+    return base64.urlsafe_b64encode(json.dumps([sort, descending, key, row.id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> tuple:
+    """(sort key, id) of the file a cursor points after, rejecting cursors of another ordering"""
+    try:
+        cursor_sort, cursor_descending, key, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "last_modified":
+            key = datetime.fromisoformat(key)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise HTTPException(status_code=400, detail="The cursor belongs to a listing with another sort order")
+    return key, file_id
+
+
+def _content_disposition(filename: str) -> str:
+    """Attachment header keeping non-ASCII filenames, with an ASCII fallback for older clients"""
+    fallback = filename.encode("ascii", "ignore").decode("ascii").replace('"', "")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    First and last byte of a single `bytes=` range, or None to serve the whole file
+
+    Malformed and multiple ranges are ignored, which RFC 9110 allows, and a
+    range starting past the end of the file is answered with a 416.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if start:
+            first = int(start)
+            last = int(end) if end else size - 1
+        else:
+            # Suffix range, the last `end` bytes, an empty suffix can never be satisfied
+            suffix = int(end)
+            if suffix < 0:
+                return None
+            first = size if suffix == 0 else max(0, size - suffix)
+            last = size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _not_modified_since(header: str, last_modified: str) -> bool:
+    """Whether an If-Modified-Since date is no older than the Last-Modified date"""
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+
+def _check_upload_size(file: UploadFile):
+    """Reject uploads whose declared size is already over the limit, before streaming them"""
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+
+
+@router.post("/upload/", status_code=202)
 async def upload_file(
         file: UploadFile = File(...),
         user: User = Security(get_current_user, scopes=["file:write"]),
         db: Session = Depends(get_db)
 ):
     """
-    Upload a file to MinIO storage and process with Docling
+    Upload a file to MinIO storage and queue it for Docling processing
+
+    Returns the id of the ingestion job, whose progress is available at /jobs/{job_id}
     """
     try:
+        _check_upload_size(file)
         file_id = uuid.uuid4().hex
-        file_content = await file.read()  # Read file content
 
-        # Upload to MinIO with user metadata
+        # Stream to MinIO with user metadata
         metadata = {
             "filename": file.filename,
             "user_id": user.sub,
             "username": user.username
         }
-        minio_entry = await minio_service.upload_file(
+        stored = await minio_service.upload_file(
             file_id=file_id,
-            file_data=io.BytesIO(file_content),
-            file_size=len(file_content),
+            file_data=file.file,
             metadata=metadata
         )
 
-        # Send to Docling for content extraction
-        try:
-            markdown_content, file_metadata = await document_service.process_file(
-                source=minio_entry
-            )
-            categories = categories_service.get_categories_for(markdown_content)
-
-            # Store metadata in database
-            file_crud.create_file_metadata(
-                db=db,
-                file_id=file_id,
-                filename=file.filename,
-                content_type=file.content_type,
-                file_metadata=file_metadata,
-                content=markdown_content,
-                user_id=user.sub,
-                categories=categories
-            )
+        # Fall back to the type sniffed from the bytes when the client sent none
+        content_type = file.content_type or stored["content_type"]
 
+        # Identical bytes were already ingested, only record the new owner
+        existing = await run_in_threadpool(
+            ingestion_service.reuse_existing,
+            db=db,
+            file_id=file_id,
+            filename=file.filename,
+            content_type=content_type,
+            user_id=user.sub,
+            content_hash=stored["sha256"]
+        )
+        if existing is not None:
+            return {
+                "message": f"Successfully uploaded {file.filename}",
+                "file_id": existing.id,
+                "job_id": None,
+                "status": "succeeded",
+                "deduplicated": True
+            }
 
-        except requests.RequestException as e:
-            print(f"Docling processing error: {e}")
-            return
-
-        # embbed the text
-        try:
-            vectors = vector_search_service.index(markdown_content)
-            vector_search_crud.create_vector_entries(db, vectors, file_id)
-
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            return
+        job = await run_in_threadpool(
+            ingestion_service.enqueue,
+            db=db,
+            file_id=file_id,
+            filename=file.filename,
+            content_type=content_type,
+            user_id=user.sub,
+            content_hash=stored["sha256"],
+            size=stored["size"],
+            last_modified=stored["last_modified"]
+        )
 
         return {
             "message": f"Successfully uploaded {file.filename}",
             "file_id": file_id,
-            "docling_processed": True
+            "job_id": job.id,
+            "status": job.status,
+            "deduplicated": False
         }
 
     except S3Error as e:
@@ -108,82 +211,160 @@ async def upload_multiple_files(
     """
     Upload multiple files to MinIO storage and process with Docling
 
+    Conversions run in parallel in the Docling process pool, at most
+    BULK_REQUEST_CONCURRENCY at a time for a single request.
+
     Returns a list of upload results for each file, including success status and any errors
     """
-    results = []
-
-    for file in files:
-        try:
+    if len(files) > settings.BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_FILES} files per request")
+
+    # Turn the request away up front rather than failing files halfway through
+    embedding_executor = get_executor("embedding")
+    classification_executor = get_executor("classification")
+    for executor in (document_service.executor, embedding_executor, classification_executor):
+        executor.admit()
+
+    request_slots = asyncio.Semaphore(settings.BULK_REQUEST_CONCURRENCY)
+    # Hashes of the files of this request, identical files are only converted once
+    request_hashes = set()
+    # The session is shared by the conversions of the request, one query at a time
+    db_lock = asyncio.Lock()
+
+    async def store_and_convert(file: UploadFile):
+        """Store a file and convert it, returns (file_id, stored, reused file, markdown, metadata)"""
+        async with request_slots:
+            _check_upload_size(file)
             file_id = uuid.uuid4().hex
-            file_content = await file.read()
 
-            # Upload to MinIO with user metadata
+            # Stream to MinIO with user metadata
             metadata = {
                 "filename": file.filename,
                 "user_id": user.sub,
                 "username": user.username
             }
 
-            minio_entry = await minio_service.upload_file(
+            stored = await minio_service.upload_file(
                 file_id=file_id,
-                file_data=io.BytesIO(file_content),
-                file_size=len(file_content),
+                file_data=file.file,
                 metadata=metadata
             )
 
-            docling_processed = False
-            # Send to Docling for content extraction
-            try:
-                markdown_content, file_metadata = await document_service.process_file(
-                    source=minio_entry
-                )
-                categories = categories_service.get_categories_for(markdown_content)
-
-                # Store metadata in database
-                file_crud.create_file_metadata(
-                    db=db,
-                    file_id=file_id,
-                    filename=file.filename,
-                    content_type=file.content_type,
-                    file_metadata=file_metadata,
-                    content=markdown_content,
-                    user_id=user.sub,
-                    categories=categories
-                )
-                docling_processed = True
-
-            except requests.RequestException as e:
-                print(f"Docling processing error for {file.filename}: {e}")
-                continue
-
-            # embbed the text
-            try:
-                vectors = vector_search_service.index(markdown_content)
-                vector_search_crud.create_vector_entries(db, vectors, file_id)
-
-            except Exception as e:
-                print(f"Embedding error: {e}")
-                continue
-
-            results.append({
+            # A copy of another file of this request reuses it once that one is saved
+            if stored["sha256"] in request_hashes:
+                return file_id, stored, None, None, None
+            request_hashes.add(stored["sha256"])
+
+            async with db_lock:
+                existing = await run_in_threadpool(ingestion_service.reuse_existing, db, file_id, file.filename,
+                                                   file.content_type or stored["content_type"], user.sub,
+                                                   stored["sha256"])
+            if existing is not None:
+                return file_id, stored, existing, None, None
+
+            # Send the local copy to Docling for content extraction
+            markdown_content, file_metadata = await document_service.process_file_in_pool(
+                filename=file.filename,
+                file_data=file.file
+            )
+            return file_id, stored, None, markdown_content, file_metadata
+
+    conversions = await asyncio.gather(
+        *(store_and_convert(file) for file in files),
+        return_exceptions=True
+    )
+
+    def failure(file: UploadFile, e: Exception) -> dict:
+        if isinstance(e, (S3Error, HTTPException)):
+            error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        else:
+            error = f"Unexpected error: {str(e)}"
+        return {"filename": file.filename, "success": False, "error": error}
+
+    async def persist(file: UploadFile, conversion) -> dict:
+        """Embed, classify and save a converted file, or report the existing file it shares"""
+        if isinstance(conversion, BaseException):
+            raise conversion
+        file_id, stored, existing, markdown_content, file_metadata = conversion
+
+        if existing is not None:
+            return {
                 "filename": file.filename,
-                "file_id": file_id,
+                "file_id": existing.id,
                 "success": True,
-                "docling_processed": docling_processed
-            })
+                "docling_processed": True,
+                "deduplicated": True
+            }
 
-        except S3Error as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": str(e)
-            })
+        # embbed the text, the embeddings also drive the classification
+        vectors = await embedding_executor.run(vector_search_service.index, markdown_content, admit=False)
+        categories = await classification_executor.run(
+            categories_service.get_categories_for,
+            markdown_content,
+            [vector["embedding"] for vector in vectors],
+            admit=False
+        )
+
+        # Store metadata and vectors in database, in one transaction
+        await run_in_threadpool(
+            file_crud.create_file_metadata,
+            db=db,
+            file_id=file_id,
+            filename=file.filename,
+            content_type=file.content_type or stored["content_type"],
+            file_metadata=file_metadata,
+            content=markdown_content,
+            user_id=user.sub,
+            categories=categories,
+            content_hash=stored["sha256"],
+            chunker_version=CHUNKER_VERSION,
+            size=stored["size"],
+            last_modified=stored["last_modified"],
+            vectors=vectors
+        )
+
+        return {
+            "filename": file.filename,
+            "file_id": file_id,
+            "success": True,
+            "docling_processed": True,
+            "deduplicated": False
+        }
+
+    results = [None] * len(files)
+    # Whether the file of this request holding each content was saved, its copies are resolved afterwards
+    saved = {}
+    copies = []
+
+    for index, (file, conversion) in enumerate(zip(files, conversions)):
+        if not isinstance(conversion, BaseException) and conversion[2] is None and conversion[3] is None:
+            copies.append(index)
+            continue
+        try:
+            results[index] = await persist(file, conversion)
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": f"Unexpected error: {str(e)}"
-            })
+            results[index] = failure(file, e)
+        finally:
+            file.file.close()
+        if not isinstance(conversion, BaseException):
+            saved[conversion[1]["sha256"]] = results[index]["success"]
+
+    for index in copies:
+        file = files[index]
+        file_id, stored, *_ = conversions[index]
+        try:
+            existing = None
+            if saved.get(stored["sha256"]):
+                existing = await run_in_threadpool(ingestion_service.reuse_existing, db, file_id, file.filename,
+                                                   file.content_type or stored["content_type"], user.sub,
+                                                   stored["sha256"])
+            if existing is None:
+                # Nothing to share, no file refers to the object stored for the copy
+                await run_in_threadpool(minio_service.delete_files, [file_id])
+                raise HTTPException(status_code=422, detail="Identical to a file of this request that failed")
+            results[index] = await persist(file, (file_id, stored, existing, None, None))
+        except Exception as e:
+            results[index] = failure(file, e)
         finally:
             file.file.close()
 
@@ -204,23 +385,23 @@ async def upload_multiple_files(
 
 
 # Add new endpoint to get file metadata
-@router.get("/files/{file_id}/metadata")
+@router.get("/files/{file_id}/metadata", response_model=FileMetadataResponse)
 async def get_file_metadata(
         file_id: str,
         user: User = Security(get_current_user, scopes=["file:read"]),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get file metadata including Docling extraction results
     """
     # Query the database for file metadata
-    file_metadata = file_crud.get_file_metadata(db, file_id)
+    file_metadata = await file_crud.get_file_with_content_async(db, file_id)
 
     if not file_metadata:
         raise HTTPException(status_code=404, detail="File metadata not found")
 
     # Check if user has access to the file
-    if not file_crud.user_owns_file(db, file_id, user.sub) and "admin" not in user.roles:
+    if file_metadata.user_id != user.sub and "admin" not in user.roles:
         raise HTTPException(status_code=403, detail="Access denied")
 
     return file_metadata
@@ -228,57 +409,206 @@ async def get_file_metadata(
 
 @router.get("/files/", response_model=List[FileInfo])
 async def list_files(
-        user: User = Security(get_current_user, scopes=["file:read"])
+        response: Response,
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: AsyncSession = Depends(get_async_db),
+        limit: Optional[int] = Query(None, ge=1, le=settings.FILE_LIST_MAX_PAGE_SIZE),
+        sort: Literal["last_modified", "filename", "size"] = "last_modified",
+        order: Literal["asc", "desc"] = "desc",
+        category: Optional[str] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        cursor: Optional[str] = None
 ):
     """
-    List all files in the storage
+    List files, optionally a page at a time
+
+    Served from the file index alone. Files are sorted by `sort` and `order`,
+    optionally restricted to a category and a modification time range. Without
+    `limit` nor `cursor` every file is returned; otherwise pages hold `limit`
+    files (FILE_LIST_PAGE_SIZE by default) and, when there are more, the
+    `X-Next-Cursor` response header holds the cursor to pass as `cursor` to get
+    the next page.
     """
-    try:
-        objects = minio_service.list_files()
-        files = []
-        for obj in objects:
-            # Get object metadata
-            metadata = minio_service.get_file_metadata(obj.object_name)
-            # Check if user has access to the file
-            if user.sub == metadata.get("x-amz-meta-user_id") or "admin" in user.roles:
-                files.append(
-                    FileInfo(
-                        fileId=obj.object_name,
-                        filename=metadata.get("x-amz-meta-filename", obj.object_name),
-                        size=obj.size,
-                        last_modified=obj.last_modified.strftime("%Y-%m-%d %H:%M:%S")
-                    )
-                )
-        return files
-    except S3Error as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    descending = order == "desc"
+    after = _decode_cursor(cursor, sort, descending) if cursor else None
+    if limit is None and cursor is not None:
+        limit = settings.FILE_LIST_PAGE_SIZE
+
+    # Duplicate uploads share a stored object, so ownership comes from the database
+    rows = await file_crud.list_files_async(
+        db,
+        None if "admin" in user.roles else user.sub,
+        sort=sort,
+        descending=descending,
+        limit=None if limit is None else limit + 1,
+        after=after,
+        category=category,
+        modified_after=modified_after,
+        modified_before=modified_before
+    )
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1], sort, descending)
+
+    return [
+        FileInfo(
+            fileId=row.id,
+            filename=row.filename,
+            content_type=row.content_type,
+            categories=row.categories or [],
+            size=row.size,
+            last_modified=row.last_modified.strftime("%Y-%m-%d %H:%M:%S")
+        )
+        for row in rows
+    ]
 
 
 @router.get("/files/{file_id}")
 async def download_file(
         file_id: str,
-        user: User = Security(get_current_user, scopes=["file:read"])
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: AsyncSession = Depends(get_async_db),
+        redirect: Optional[bool] = None,
+        range_header: Optional[str] = Header(None, alias="Range"),
+        if_range: Optional[str] = Header(None),
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None)
 ):
     """
     Download a file from storage
+
+    Supports single byte ranges and conditional requests on the ETag or
+    Last-Modified of the file. With `redirect` (defaults to DOWNLOAD_MODE being
+    "redirect") the response redirects to a short-lived presigned MinIO URL,
+    so the bytes do not pass through the API.
     """
-    # Get object metadata
-    metadata = minio_service.get_file_metadata(file_id)
+    db_file = await file_crud.get_stored_object_async(db, file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
 
     # Check if user has access to the file
-    if user.sub != metadata.get("x-amz-meta-user_id") and "admin" not in user.roles:
+    if db_file.user_id != user.sub and "admin" not in user.roles:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    data, metadata = minio_service.download_file(file_id)
-    filename = metadata.get("x-amz-meta-filename", file_id)
+    # The content hash identifies the bytes, MinIO is only asked about files stored before it was recorded
+    if db_file.content_hash is not None and db_file.size is not None:
+        etag, size, last_modified = f'"{db_file.content_hash}"', db_file.size, db_file.last_modified
+    else:
+        stat = await run_in_threadpool(minio_service.stat_object, db_file.object_name)
+        etag, size, last_modified = f'"{stat.etag}"', stat.size, stat.last_modified
+
+    last_modified = format_datetime(last_modified.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": "private, no-cache"
+    }
+
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    content_type = db_file.content_type or "application/octet-stream"
+    content_disposition = _content_disposition(db_file.filename)
+
+    if (settings.DOWNLOAD_MODE == "redirect") if redirect is None else redirect:
+        url = minio_service.presigned_download_url(db_file.object_name, content_disposition, content_type)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+
+    # A range is only served while the file still matches the validator of If-Range
+    byte_range = None
+    if range_header is not None and (if_range is None or if_range.strip() in (etag, last_modified)):
+        byte_range = _parse_range(range_header, size)
+
+    headers |= {"Accept-Ranges": "bytes", "Content-Disposition": content_disposition}
+    if byte_range is None:
+        status_code, offset, length = 200, 0, 0
+        headers["Content-Length"] = str(size)
+    else:
+        first, last = byte_range
+        status_code, offset, length = 206, first, last - first + 1
+        headers |= {"Content-Range": f"bytes {first}-{last}/{size}", "Content-Length": str(length)}
+
+    data = await run_in_threadpool(minio_service.open_object, db_file.object_name, offset, length)
 
     return StreamingResponse(
-        data,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        minio_service.stream_object(data),
+        status_code=status_code,
+        media_type=content_type,
+        headers=headers
     )
 
 
+async def _delete_files(db: Session, user: User, file_ids: List[str]) -> List[dict]:
+    """
+    Delete the files the user is allowed to, returns the result of each file
+
+    Ownership is checked in one query, the metadata and embeddings of every
+    file are deleted in one transaction, then the objects no other upload of
+    the same bytes uses are removed from MinIO in batches. An object that fails
+    to be removed is left to the reconciliation job, the file is deleted anyway.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    db_files = {db_file.id: db_file for db_file in await run_in_threadpool(file_crud.get_files_by_ids, db, file_ids)}
+
+    results = {}
+    deletable = []
+    for file_id in file_ids:
+        db_file = db_files.get(file_id)
+        if db_file is None:
+            results[file_id] = {"file_id": file_id, "success": False, "status_code": 404,
+                                "error": "File metadata not found"}
+        elif db_file.user_id != user.sub and "admin" not in user.roles:
+            results[file_id] = {"file_id": file_id, "success": False, "status_code": 403, "error": "Access denied"}
+        else:
+            results[file_id] = {"file_id": file_id, "filename": db_file.filename, "success": True}
+            deletable.append(db_file)
+
+    if deletable:
+        unused_objects = await run_in_threadpool(vector_search_crud.delete_files, db, deletable)
+        errors = await run_in_threadpool(minio_service.delete_files, unused_objects) if unused_objects else {}
+        for db_file in deletable:
+            if db_file.object_name in errors:
+                results[db_file.id]["storage_error"] = errors[db_file.object_name]
+
+    return list(results.values())
+
+
+@router.post("/delete/bulk/")
+async def delete_multiple_files(
+        request: BulkDeleteRequest,
+        user: User = Security(get_current_user, scopes=["file:write"]),
+        db: Session = Depends(get_db)
+):
+    """
+    Delete multiple files from storage and their associated metadata
+
+    Returns a list of delete results for each file, including success status and any errors
+    """
+    if len(request.file_ids) > settings.BULK_DELETE_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_DELETE_MAX_FILES} files per request")
+
+    results = await _delete_files(db, user, request.file_ids)
+
+    total_files = len(results)
+    deleted_files = len([r for r in results if r["success"]])
+
+    return {
+        "message": f"Processed {total_files} files",
+        "summary": {
+            "total_files": total_files,
+            "deleted_files": deleted_files,
+            "failed_deletes": total_files - deleted_files
+        },
+        "results": results
+    }
+
+
 @router.delete("/files/{file_id}")
 async def delete_file(
         file_id: str,
@@ -287,20 +617,13 @@ async def delete_file(
 ):
     """
     Delete a file from storage and its associated metadata
-    """
-    metadata = minio_service.get_file_metadata(file_id)
-
-    # Check if user has access to the file
-    if not file_crud.user_owns_file(db, file_id, user.sub) and "admin" not in user.roles:
-        raise HTTPException(status_code=403, detail="Access denied")
 
-    # Delete from MinIO
-    minio_service.delete_file(file_id)
+    The stored object is only removed once no other upload of the same bytes uses it
+    """
+    result, = await _delete_files(db, user, [file_id])
+    if not result["success"]:
+        raise HTTPException(status_code=result["status_code"], detail=result["error"])
 
-    # Delete metadata from PostgreSQL
-    if vector_search_crud.delete_file(db, file_id):
-        return {
-            "message": f"Successfully deleted {metadata.get('x-amz-meta-filename', file_id)} and its metadata"
-        }
-    else:
-        raise HTTPException(status_code=404, detail="File metadata not found")
+    return {
+        "message": f"Successfully deleted {result['filename']} and its metadata"
+    }
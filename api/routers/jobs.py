@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from sse_starlette.sse import EventSourceResponse
+
+from core.config import get_settings
+from core.security import get_current_user, require_roles
+from crud import job as job_crud
+from db.database import get_db, SessionLocal
+from schemas.auth import User
+from schemas.job import JobStatus
+from routers.file import ingestion_service, reconciliation_service
+
+settings = get_settings()
+
+router = APIRouter(tags=['Jobs'])
+
+
+def _get_owned_job(db: Session, job_id: str, user: User):
+    db_job = job_crud.get_job(db, job_id)
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if db_job.user_id != user.sub and "admin" not in user.roles:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return db_job
+
+
+def _load_job(job_id: str):
+    """Read a job in a session of its own, the request session is closed while the stream runs"""
+    with SessionLocal() as session:
+        return job_crud.get_job(session, job_id)
+
+
+@router.post("/jobs/rechunk", status_code=202)
+async def rechunk_documents(
+        user: User = Security(require_roles(["admin"])),
+        db: Session = Depends(get_db)
+):
+    """
+    Queue documents indexed by an older chunker to be re-chunked and re-embedded from their stored content
+    """
+    queued = await run_in_threadpool(ingestion_service.enqueue_rechunk, db)
+    return {"message": f"Queued {queued} documents for re-chunking", "queued": queued}
+
+
+@router.post("/jobs/reconcile")
+async def reconcile_files(
+        delete_orphans: Optional[bool] = None,
+        user: User = Security(require_roles(["admin"])),
+        db: Session = Depends(get_db)
+):
+    """
+    Bring the stored size and modification time of files in sync with the bucket
+
+    Reports files whose object is missing and objects no file refers to, which
+    are removed when `delete_orphans` is set (defaults to FILE_RECONCILE_DELETE_ORPHANS)
+    """
+    return await run_in_threadpool(reconciliation_service.reconcile, db, delete_orphans)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(
+        job_id: str,
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: Session = Depends(get_db)
+):
+    """
+    Get the progress of an ingestion job
+    """
+    return await run_in_threadpool(_get_owned_job, db, job_id, user)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(
+        job_id: str,
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: Session = Depends(get_db)
+):
+    """
+    Stream ingestion job progress as server-sent events until the job finishes
+    """
+    await run_in_threadpool(_get_owned_job, db, job_id, user)
+
+    async def event_stream():
+        last_status = None
+        while True:
+            db_job = await run_in_threadpool(_load_job, job_id)
+            if db_job is None:
+                # Deleted while streaming, e.g. with its file
+                yield {"event": "error", "data": json.dumps({"detail": "Job not found"})}
+                break
+            status = JobStatus.model_validate(db_job)
+
+            if status != last_status:
+                yield {"event": "status", "data": status.model_dump_json()}
+                last_status = status
+
+            if status.status in ("succeeded", "failed"):
+                break
+            await asyncio.sleep(settings.INGESTION_POLL_INTERVAL)
+
+    return EventSourceResponse(event_stream(), media_type="text/event-stream")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Security
+
+from core.config import get_settings
+from core.registry import model_registry
+from core.security import require_roles, token_verifier
+from schemas.auth import User
+from services.embeddingBatcher import get_batcher_stats
+from services.embeddingCache import get_embedding_cache
+from services.executors import get_executor_stats
+from services.searchCache import get_search_cache
+
+settings = get_settings()
+
+router = APIRouter(tags=['Metrics'])
+
+
+@router.get("/metrics/")
+async def get_metrics(
+        user: User = Security(require_roles(["admin"]))
+):
+    """
+    Get runtime metrics of the API caches and workers
+    """
+    return {
+        "embedding_cache": get_embedding_cache().get_stats() if settings.EMBEDDING_CACHE_ENABLED else None,
+        "search_cache": get_search_cache().get_stats() if settings.SEARCH_CACHE_ENABLED else None,
+        "query_batching": get_batcher_stats(),
+        "models": model_registry.get_stats(),
+        "executors": get_executor_stats(),
+        "auth": token_verifier.get_stats()
+    }
@@ -1,14 +1,15 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Security
+from fastapi import APIRouter, Depends, HTTPException, Query, Security
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.security import get_current_user
-from db.database import get_db
+from db.database import get_async_db
 from schemas.auth import User
-from schemas.search import SearchResult
+from schemas.search import SearchResult, HybridSearchResult
+from services.categories import canonical_category
+from services.searchCache import get_search_cache, normalize_query
 from services.vectorSearch import VectorSearchService
-from crud import file as file_crud
 
 vector_search_service = VectorSearchService()
 router = APIRouter(tags=['Search'])
@@ -31,67 +32,96 @@ def format_tsquery(query: str) -> str:
 async def search_documents_full_content(
         query: str,
         user: User = Security(get_current_user, scopes=["file:read"]),
-        db: Session = Depends(get_db),
-        category: Optional[str] = None
+        db: AsyncSession = Depends(get_async_db),
+        category: Optional[str] = None,
+        fragments: int = Query(3, ge=1, le=10),
+        max_words: int = Query(35, ge=5, le=100),
+        limit: int = Query(10, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        after_rank: Optional[float] = None,
+        after_id: Optional[str] = None
 ):
     """
-    Search through document content and return full documents with all matches highlighted.
+    Search through document content and return the best matching fragments of each document.
     Features:
-    - Returns complete document content with all matches highlighted
-    - Uses PostgreSQL's ts_headline with custom configuration
+    - Returns up to `fragments` highlighted snippets of at most `max_words` words per document
+    - Highlights are computed only for the page being returned
     - Maintains search ranking
-    - Preserves document structure
+    - Pages with `limit`/`offset`, or by keyset passing the rank and file_id of the last result
+      as `after_rank`/`after_id`
     - Handles multi-word searches
+
+    Use `/search/{file_id}/highlight` to get a whole document highlighted.
     """
-    # Generate tsvector on-the-fly since we haven't added the column yet
-    search_query = text("""
-        WITH search_results AS (
+    keyset = after_rank is not None and after_id is not None
+    category = canonical_category(category)
+
+    # Admins search every user's files, so their results are not tied to one user's corpus and are not cached
+    search_cache = get_search_cache()
+    cache_key = None
+    if "admin" not in user.roles:
+        cache_key = search_cache.key(
+            "search", user.sub, query=normalize_query(query).lower(), category=category, fragments=fragments,
+            max_words=max_words, limit=limit, offset=offset, after_rank=after_rank, after_id=after_id
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # The page is materialized first so ts_headline only runs on the rows returned. Duplicate uploads
+    # are matched against the content they share, held by the row named by their content_id
+    search_query = text(f"""
+        WITH page AS MATERIALIZED (
             SELECT 
                 fm.id,
                 fm.filename,
                 fm.content_type,
-                fm.content,
+                src.content,
                 fm.categories,
-                ts_rank(to_tsvector('english', fm.content), plainto_tsquery('english', :query)) as rank
+                ts_rank(src.search_vector, plainto_tsquery('english', :query)) as rank
             FROM file_metadata fm
-            WHERE to_tsvector('english', fm.content) @@ plainto_tsquery('english', :query)
-                AND (fm.user_id = :user_id OR :is_admin) 
-                AND (:category IS NULL OR :category ILIKE ANY(fm.categories))
+            JOIN file_metadata src ON src.id = fm.content_id
+            WHERE src.search_vector @@ plainto_tsquery('english', :query)
+                AND (fm.user_id = :user_id OR (:is_admin AND fm.user_id IS NOT NULL)) 
+                AND (CAST(:category AS TEXT) IS NULL OR :category = ANY(fm.categories))
+                {"AND (ts_rank(src.search_vector, plainto_tsquery('english', :query)), fm.id) < (CAST(:after_rank AS REAL), :after_id)" if keyset else ""}
+            ORDER BY rank DESC, fm.id DESC
+            LIMIT :limit
+            OFFSET :offset
         )
         SELECT 
-            sr.id,
-            sr.filename,
-            sr.content_type,
-            sr.categories,
+            page.id,
+            page.filename,
+            page.content_type,
+            page.categories,
             ts_headline(
                 'english',
-                sr.content,
+                page.content,
                 plainto_tsquery('english', :query),
-                'StartSel = <mark>, 
-                 StopSel = </mark>, 
-                 MaxFragments = 0,
-                 MinWords = 1,
-                 MaxWords = 10000000,
-                 ShortWord = 2,
-                 HighlightAll = true'
+                :headline_options
             ) as content_preview,
-            sr.rank
-        FROM search_results sr
-        ORDER BY sr.rank DESC
-        LIMIT 10
+            page.rank
+        FROM page
+        ORDER BY page.rank DESC, page.id DESC
     """)
 
+    params = {
+        "query": query,
+        "user_id": user.sub,
+        "is_admin": "admin" in user.roles,
+        "category": category,
+        "limit": limit,
+        "offset": 0 if keyset else offset,
+        "headline_options": f"StartSel = <mark>, StopSel = </mark>, MaxFragments = {fragments}, "
+                            f"MaxWords = {max_words}, MinWords = {min(15, max_words // 2)}, "
+                            f"ShortWord = 2, FragmentDelimiter = \" ... \""
+    }
+    if keyset:
+        params |= {"after_rank": after_rank, "after_id": after_id}
+
     # Execute the search query
     try:
-        results = db.execute(
-            search_query,
-            {
-                "query": query,
-                "user_id": user.sub,
-                "is_admin": "admin" in user.roles,
-                "category": category
-            }
-        )
+        results = await db.execute(search_query, params)
 
         # Convert the results to a list of SearchResult objects
         search_results = []
@@ -105,6 +135,8 @@ async def search_documents_full_content(
                 "rank": float(row.rank)
             })
 
+        if cache_key is not None:
+            search_cache.set(cache_key, search_results)
         return search_results
 
     except Exception as e:
@@ -113,20 +145,119 @@ async def search_documents_full_content(
         return []
 
 
+@router.get("/search/{file_id}/highlight", response_model=SearchResult)
+async def highlight_document(
+        file_id: str,
+        query: str,
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Return a whole document with every match of the query highlighted, for when a search result is opened.
+    """
+    row = (await db.execute(text("""
+        SELECT 
+            fm.id,
+            fm.filename,
+            fm.content_type,
+            fm.categories,
+            ts_headline(
+                'english',
+                src.content,
+                plainto_tsquery('english', :query),
+                'StartSel = <mark>, 
+                 StopSel = </mark>, 
+                 MaxFragments = 0,
+                 MinWords = 1,
+                 MaxWords = 10000000,
+                 ShortWord = 2,
+                 HighlightAll = true'
+            ) as content_preview,
+            ts_rank(src.search_vector, plainto_tsquery('english', :query)) as rank
+        FROM file_metadata fm
+        JOIN file_metadata src ON src.id = fm.content_id
+        WHERE fm.id = :file_id AND (fm.user_id = :user_id OR :is_admin)
+    """), {"query": query, "file_id": file_id, "user_id": user.sub, "is_admin": "admin" in user.roles})).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return {
+        "file_id": row.id,
+        "filename": row.filename,
+        "content_type": row.content_type,
+        "content_preview": row.content_preview,
+        "categories": row.categories,
+        "rank": float(row.rank or 0)
+    }
+
+
 @router.get("/contextualsearch/")
 async def search_documents_contextual_content(
         query: str,
         filters: Optional[str] = "",
         user: User = Security(get_current_user, scopes=["file:read"]),
-        db: Session = Depends(get_db),
-        context_range: Optional[int] = 400
+        db: AsyncSession = Depends(get_async_db),
+        context_range: Optional[int] = 400,
+        category: Optional[str] = None,
+        ef_search: Optional[int] = Query(None, ge=1, le=1000),
+        probes: Optional[int] = Query(None, ge=1, le=1000)
 ):
     """
     Search through document content and return contextual snippets with matches highlighted.
+
+    ef_search (HNSW) and probes (IVFFlat) trade recall for latency, defaulting to the configured values.
     """
-    files = vector_search_service.search_by_vector(db, query, filters, context_range)
-    results = []
-    for file in range(len(files)):
-        if file_crud.get_file_metadata(db, files[file]['file_id']).user_id == user.sub:
-            results.append(files[file])
+    category = canonical_category(category)
+    search_cache = get_search_cache()
+    cache_key = search_cache.key(
+        "contextualsearch", user.sub, query=normalize_query(query), filters=normalize_query(filters),
+        context_range=context_range, category=category, ef_search=ef_search, probes=probes
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    results = await vector_search_service.search_by_vector(
+        db, query, filters, user.sub, context_range, category, ef_search, probes
+    )
+    search_cache.set(cache_key, results)
+    return results
+
+
+@router.get("/hybridsearch/", response_model=List[HybridSearchResult])
+async def search_documents_hybrid(
+        query: str,
+        user: User = Security(get_current_user, scopes=["file:read"]),
+        db: AsyncSession = Depends(get_async_db),
+        category: Optional[str] = None,
+        limit: int = Query(10, ge=1, le=100),
+        lexical_candidates: Optional[int] = Query(None, ge=1, le=1000),
+        vector_candidates: Optional[int] = Query(None, ge=1, le=1000),
+        lexical_weight: Optional[float] = Query(None, ge=0),
+        vector_weight: Optional[float] = Query(None, ge=0),
+        ef_search: Optional[int] = Query(None, ge=1, le=1000),
+        probes: Optional[int] = Query(None, ge=1, le=1000)
+):
+    """
+    Search with full-text ranking and vector similarity at once, merged with reciprocal-rank fusion.
+
+    The candidate pool sizes and weights of each ranking default to the configured values.
+    """
+    category = canonical_category(category)
+    search_cache = get_search_cache()
+    cache_key = search_cache.key(
+        "hybridsearch", user.sub, query=normalize_query(query), category=category, limit=limit,
+        lexical_candidates=lexical_candidates, vector_candidates=vector_candidates,
+        lexical_weight=lexical_weight, vector_weight=vector_weight, ef_search=ef_search, probes=probes
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    results = await vector_search_service.hybrid_search(
+        db, query, user.sub, category, limit, lexical_candidates, vector_candidates,
+        lexical_weight, vector_weight, ef_search, probes
+    )
+    search_cache.set(cache_key, results)
     return results
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from pydantic import BaseModel
 
@@ -8,17 +8,24 @@ class FileInfo(BaseModel):
     """Schema for file information with additional fields"""
     fileId: str
     filename: str
-    size: int
+    content_type: Optional[str] = None
+    categories: List[str] = []
+    size: Optional[int] = None  # Unknown for files stored before sizes were recorded, until reconciled
     last_modified: str
 
 
 class FileMetadataResponse(BaseModel):
-    """Schema for file metadata response"""
-    file_id: str
+    """Schema for file metadata response, the columns of the file without the internal ones such as search_vector"""
+    id: str
     filename: str
-    content_type: str
-    file_metadata: Dict[str, Any]
-    content: str
+    content_type: Optional[str] = None
+    file_metadata: Optional[Dict[str, Any]] = None
+    content: Optional[str] = None
+    categories: Optional[List[str]] = None
+    user_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    last_modified: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -36,3 +43,8 @@ class FileUploadResponse(BaseModel):
 class FileDeleteResponse(BaseModel):
     """Schema for file delete response"""
     message: str
+
+
+class BulkDeleteRequest(BaseModel):
+    """Schema for bulk file delete request"""
+    file_ids: List[str]
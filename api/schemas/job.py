@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class JobStatus(BaseModel):
+    """Schema for ingestion job progress"""
+    id: str
+    kind: str
+    file_id: str
+    filename: str
+    status: str
+    stage: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,5 +1,8 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
+
 class SearchResult(BaseModel):
     file_id: str
     filename: str
@@ -10,3 +13,14 @@ class SearchResult(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class HybridSearchResult(BaseModel):
+    file_id: str
+    filename: str
+    content_type: str
+    content_preview: str
+    categories: list[str]
+    score: float
+    lexical_rank: Optional[int] = None
+    vector_rank: Optional[int] = None
@@ -1,44 +1,108 @@
-from transformers import pipeline
+from typing import Optional
+
+import numpy as np
+
+from core.config import get_settings
+from core.registry import model_registry, EMBEDDING_MODEL, ZERO_SHOT_MODEL
+
+settings = get_settings()
+
+LABELS = [
+    "Computer Science",
+    "Physics",
+    "Biology and Medicine",
+    "Engineering",
+    "Mathematics",
+    "Social Sciences",
+    "Environmental Science",
+    "Chemistry",
+    "Earth Sciences",
+    "Education",
+    "Philosophy",
+    "Linguistics",
+    "Statistics",
+    "Economics",
+    "Information Science",
+    "Neuroscience",
+    "Agricultural Science",
+    "Materials Science",
+    "Astronomy",
+    "Interdisciplinary Studies"
+]
+
+
+_LABELS_BY_KEY = {label.casefold(): label for label in LABELS}
+
+
+def canonical_category(category: Optional[str]) -> Optional[str]:
+    """The stored spelling of a category given in any case, unknown categories are returned as they are"""
+    if category is None:
+        return None
+    return _LABELS_BY_KEY.get(category.strip().casefold(), category)
+
+
+# Text embedded for each label when classifying in embedding space
+LABEL_PROTOTYPE = "A research document about {label}."
 
 
 class CategoryService:
-    def __init__(self):
-        self.classifier = pipeline("zero-shot-classification",
-                                   model="facebook/bart-large-mnli")
-
-        self.labels = [
-            "Computer Science",
-            "Physics",
-            "Biology and Medicine",
-            "Engineering",
-            "Mathematics",
-            "Social Sciences",
-            "Environmental Science",
-            "Chemistry",
-            "Earth Sciences",
-            "Education",
-            "Philosophy",
-            "Linguistics",
-            "Statistics",
-            "Economics",
-            "Information Science",
-            "Neuroscience",
-            "Agricultural Science",
-            "Materials Science",
-            "Astronomy",
-            "Interdisciplinary Studies"
-        ]
-
-    def get_categories_for(self, markdown_text):
+    """
+    Assigns up to three categories to a document.
+
+    The "embedding" mode scores labels by cosine similarity between precomputed
+    label embeddings and the mean of the document chunk embeddings, reusing the
+    vectors computed for search. The "zero-shot" mode runs BART-MNLI instead,
+    which is far slower.
+    """
+
+    def __init__(self, mode: Optional[str] = None):
+        self.labels = LABELS
+        self.mode = mode or settings.CATEGORY_MODE
+        self._label_embeddings: Optional[np.ndarray] = None
+
+    @property
+    def classifier(self):
+        return model_registry.get(ZERO_SHOT_MODEL)
+
+    @property
+    def label_embeddings(self) -> np.ndarray:
+        if self._label_embeddings is None:
+            prototypes = [LABEL_PROTOTYPE.format(label=label) for label in self.labels]
+            self._label_embeddings = model_registry.get(EMBEDDING_MODEL).encode(prototypes, normalize_embeddings=True)
+        return self._label_embeddings
+
+    def get_categories_for(self, markdown_text, chunk_embeddings=None):
+        if self.mode == "zero-shot":
+            return self._classify_zero_shot(markdown_text)
+        return self._classify_by_embedding(markdown_text, chunk_embeddings)
+
+    def _classify_zero_shot(self, markdown_text):
         markdown_text = markdown_text[:8192]
         result = self.classifier(markdown_text, self.labels, multi_class=True)
 
         categories = list()
         for i in range(len(result["labels"][:3])):
-            if result["scores"][i] > 0.80:
+            if result["scores"][i] > settings.CATEGORY_THRESHOLD:
                 categories.append(result["labels"][i])
 
         return categories
 
+    def _classify_by_embedding(self, markdown_text, chunk_embeddings=None):
+        if chunk_embeddings is None or len(chunk_embeddings) == 0:
+            chunk_embeddings = model_registry.get(EMBEDDING_MODEL).encode([markdown_text[:8192]])
+
+        chunk_embeddings = np.asarray(chunk_embeddings, dtype=np.float32)
+        chunk_embeddings /= np.maximum(np.linalg.norm(chunk_embeddings, axis=1, keepdims=True), 1e-12)
+        document_embedding = chunk_embeddings.mean(axis=0)
+        document_embedding /= max(np.linalg.norm(document_embedding), 1e-12)
+
+        scores = self.label_embeddings @ document_embedding
+        categories = list()
+        for i in np.argsort(-scores)[:3]:
+            if scores[i] > settings.CATEGORY_EMBEDDING_THRESHOLD:
+                categories.append(self.labels[i])
+
+        return categories
+
     def get_all_categories(self):
         return self.labels
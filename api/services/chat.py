@@ -1,20 +1,31 @@
-from typing import List, Optional, Any, Coroutine, Generator
+from typing import List, Optional, AsyncGenerator
 import asyncio
-from dataclasses import dataclass, field
+import threading
+from dataclasses import field
 
-import numpy as np
 from llama_index.core import Settings
 from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.core.base.llms.types import CompletionResponse
 from llama_index.llms.llama_cpp import LlamaCPP
 from sentence_transformers import SentenceTransformer
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.registry import model_registry, EMBEDDING_MODEL
+from crud import vectorSearch as vector_search_crud
 from models.file import FileMetadata, FileEmbedding
+from services.embeddingBatcher import QueryEmbeddingBatcher, get_query_batcher
+from services.executors import get_executor
+
+LLM_MODEL = "llm"
 
 
 class CustomEmbedding(BaseEmbedding):
-    model: Optional[SentenceTransformer] = field(default=None, init=False)
+    query_batcher: Optional[QueryEmbeddingBatcher] = field(default=None, init=False)
+
+    @property
+    def model(self) -> SentenceTransformer:
+        return model_registry.get(EMBEDDING_MODEL)
 
     def _get_query_embedding(self, query: str) -> List[float]:
         return self.model.encode(query).tolist()
@@ -26,6 +37,8 @@ class CustomEmbedding(BaseEmbedding):
         return self.model.encode(texts).tolist()
 
     async def _aget_query_embedding(self, query: str) -> List[float]:
+        if self.query_batcher is not None:
+            return await self.query_batcher.embed(query)
         return self._get_query_embedding(query)
 
     async def _aget_text_embedding(self, text: str) -> List[float]:
@@ -37,11 +50,19 @@ class CustomEmbedding(BaseEmbedding):
 
 class RAGPipeline:
     def __init__(self, llm_model_path: str):
-        # Initialize embedding model
-        self.embed_model = CustomEmbedding(model=SentenceTransformer("all-MiniLM-L6-v2"))
+        # Models are loaded by the registry on first use
+        self.embed_model = CustomEmbedding(
+            query_batcher=get_query_batcher(EMBEDDING_MODEL, lambda texts: self.embed_model.model.encode(texts))
+        )
+        model_registry.register(LLM_MODEL, lambda: self._load_llm(llm_model_path))
+
+        # Configure global settings
+        Settings.embed_model = self.embed_model
 
+    @staticmethod
+    def _load_llm(llm_model_path: str) -> LlamaCPP:
         # Initialize Llama model for text generation
-        self.llm = LlamaCPP(
+        return LlamaCPP(
             model_path=llm_model_path,
             model_kwargs={
                 "n_gpu_layers": 0,  # Set > 0 to use GPU
@@ -54,54 +75,72 @@ class RAGPipeline:
             verbose=True,
         )
 
-        # Configure global settings
-        Settings.embed_model = self.embed_model
-        Settings.llm = self.llm
+    @property
+    def llm(self) -> LlamaCPP:
+        return model_registry.get(LLM_MODEL)
 
-    def query_documents(self,
-                        session: Session,
+    async def query_documents(self,
+                        session: AsyncSession,
                         query: str,
                         user_id: str,
                         categories: List[str] = None,
-                        top_k: int = 3) -> Generator[CompletionResponse, None, None]:
+                        top_k: int = 3) -> AsyncGenerator[CompletionResponse, None]:
         """Query documents and generate a natural language response."""
-        # Get query embedding
-        query_embedding = self.embed_model.get_text_embedding(query)
-
-        # Query vector store
-        results = session.query(
-            FileEmbedding,
-            FileMetadata
+        # Refuse before retrieval when the generation queue is already too long
+        get_executor("llm").admit()
+
+        # Get query embedding, batched with concurrent queries
+        query_embedding = await self.embed_model.aget_query_embedding(query)
+
+        # Query vector store, with the same metric as the ANN index
+        distance = vector_search_crud.distance_to(query_embedding)
+        await vector_search_crud.set_search_params(session)
+        query_statement = select(
+            FileMetadata.id,
+            FileMetadata.filename,
+            FileMetadata.content_type,
+            FileMetadata.categories,
+            FileMetadata.created_at,
+            func.substring(
+                vector_search_crud.ContentRow.content,
+                FileEmbedding.start_position + 1,
+                FileEmbedding.end_position - FileEmbedding.start_position
+            ).label("chunk"),
+            distance.label("distance")
+        ).select_from(
+            FileEmbedding
         ).join(
+            # The user's files, including duplicates sharing the vectors of another upload
             FileMetadata,
-            FileEmbedding.file_id == FileMetadata.id
-        ).filter(
-            FileMetadata.user_id == user_id
+            and_(FileMetadata.content_id == FileEmbedding.file_id, FileMetadata.user_id == user_id)
+        ).join(
+            vector_search_crud.ContentRow,
+            vector_search_crud.ContentRow.id == FileEmbedding.file_id
         )
 
         if categories:
-            results = results.filter(
-                FileMetadata.categories.overlap(categories)
+            query_statement = query_statement.filter(
+                FileEmbedding.categories.overlap(categories)
             )
 
-        results = results.order_by(
-            FileEmbedding.embedding.l2_distance(query_embedding)
-        ).limit(top_k).all()
+        results = (await session.execute(
+            query_statement.order_by(distance).limit(top_k)
+        )).all()
 
         # Format retrieved documents
         retrieved_docs = [
             {
-                "filename": metadata.filename,
-                "content": metadata.content[embedding.start_position:embedding.end_position],
-                "categories": metadata.categories,
-                "score": 1.0 / (1.0 + np.linalg.norm(query_embedding - embedding.embedding)),
+                "filename": row.filename,
+                "content": row.chunk,
+                "categories": row.categories,
+                "score": vector_search_crud.similarity_from_distance(row.distance),
                 "metadata": {
-                    "file_id": metadata.id,
-                    "content_type": metadata.content_type,
-                    "created_at": metadata.created_at.isoformat()
+                    "file_id": row.id,
+                    "content_type": row.content_type,
+                    "created_at": row.created_at.isoformat()
                 }
             }
-            for embedding, metadata in results
+            for row in results
         ]
 
         # Prepare context for LLM
@@ -120,7 +159,36 @@ Context:
 <|im_end|>
 <|im_start|>assistant"""
 
-        print(prompt)
-        response = self.llm.stream_complete(prompt, formatted=True, stop=["<|im_end|>"])
-
-        return response
+        return self._generate(prompt)
+
+    async def _generate(self, prompt: str) -> AsyncGenerator[CompletionResponse, None]:
+        """
+        Stream a completion generated on the LLM executor.
+
+        The whole generation runs as one task on the executor, so a worker
+        owns the model until the answer is complete, and tokens are handed
+        back to the event loop as they are produced. When the client goes away
+        the generation stops at the next token, freeing the worker.
+        """
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def generate():
+            try:
+                for token in self.llm.stream_complete(prompt, formatted=True, stop=["<|im_end|>"]):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+
+        generation = asyncio.ensure_future(get_executor("llm").run(generate, admit=False))
+        try:
+            while (token := await tokens.get()) is not None:
+                yield token
+            await generation
+        finally:
+            # Closed or cancelled on disconnect, a generation still queued never starts
+            stopped.set()
+            generation.cancel()
@@ -0,0 +1,148 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, List
+
+# Bump when the chunking rules change, so existing documents can be re-chunked
+CHUNKER_VERSION = 1
+
+_HEADING = re.compile(r"^#{1,6}\s")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_WORD = re.compile(r"\S+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    start_position: int
+    end_position: int
+
+
+@dataclass
+class _Unit:
+    start: int
+    end: int
+    tokens: int
+    heading: bool = False
+
+
+class MarkdownChunker:
+    """
+    Splits markdown into chunks of at most max_tokens tokens for embedding.
+
+    Headings always start a new chunk, and paragraphs and tables are kept whole
+    when they fit. Blocks over the budget are split by line, and lines over the
+    budget by word. Consecutive chunks share up to overlap_tokens tokens.
+    Offsets index into the original text, so content[start:end] is the chunk.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], max_tokens: int, overlap_tokens: int = 0):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    def split(self, text: str) -> List[Chunk]:
+        chunks = []
+        current: List[_Unit] = []
+        current_tokens = 0
+
+        def flush(keep_overlap: bool):
+            nonlocal current, current_tokens
+            if current:
+                start, end = current[0].start, current[-1].end
+                chunks.append(Chunk(text[start:end], start, end))
+
+            carried = []
+            carried_tokens = 0
+            if keep_overlap:
+                for unit in reversed(current):
+                    if carried_tokens + unit.tokens > self.overlap_tokens:
+                        break
+                    carried.insert(0, unit)
+                    carried_tokens += unit.tokens
+            current, current_tokens = carried, carried_tokens
+
+        for unit in self._units(text):
+            if unit.heading:
+                flush(keep_overlap=False)
+            elif current and current_tokens + unit.tokens > self.max_tokens:
+                flush(keep_overlap=True)
+                # The overlap must leave room for the unit itself
+                while current and current_tokens + unit.tokens > self.max_tokens:
+                    current_tokens -= current.pop(0).tokens
+            current.append(unit)
+            current_tokens += unit.tokens
+
+        flush(keep_overlap=False)
+        return chunks
+
+    def _units(self, text: str):
+        """Yield headings, paragraphs and tables, split further when over the token budget"""
+        for start, end, heading in self._blocks(text):
+            tokens = self.count_tokens(text[start:end])
+            if tokens <= self.max_tokens:
+                yield _Unit(start, end, tokens, heading)
+                continue
+
+            for line in re.finditer(r"[^\n]+", text[start:end]):
+                line_start, line_end = start + line.start(), start + line.end()
+                line_tokens = self.count_tokens(line.group())
+                if line_tokens <= self.max_tokens:
+                    yield _Unit(line_start, line_end, line_tokens, heading and line_start == start)
+                else:
+                    yield from self._split_words(text, line_start, line_end)
+
+    def _split_words(self, text: str, start: int, end: int):
+        piece_start = None
+        piece_end = start
+        piece_tokens = 0
+        for word in _WORD.finditer(text, start, end):
+            word_tokens = self.count_tokens(word.group())
+            if piece_start is not None and piece_tokens + word_tokens > self.max_tokens:
+                yield _Unit(piece_start, piece_end, piece_tokens)
+                piece_start = None
+                piece_tokens = 0
+            if piece_start is None:
+                piece_start = word.start()
+            piece_end = word.end()
+            piece_tokens += word_tokens
+        if piece_start is not None:
+            yield _Unit(piece_start, piece_end, piece_tokens)
+
+    @staticmethod
+    def _blocks(text: str):
+        """Yield (start, end, is_heading) for headings, tables and paragraphs"""
+        block_start = None
+        block_end = 0
+        in_table = False
+        position = 0
+
+        for line in text.splitlines(keepends=True):
+            line_start, position = position, position + len(line)
+            content = line.rstrip("\r\n")
+            line_end = line_start + len(content)
+
+            if not content.strip():
+                if block_start is not None:
+                    yield block_start, block_end, False
+                    block_start = None
+                continue
+
+            if _HEADING.match(content):
+                if block_start is not None:
+                    yield block_start, block_end, False
+                    block_start = None
+                yield line_start, line_end, True
+                continue
+
+            is_table = bool(_TABLE_ROW.match(content))
+            if block_start is not None and is_table != in_table:
+                yield block_start, block_end, False
+                block_start = None
+
+            if block_start is None:
+                block_start = line_start
+                in_table = is_table
+            block_end = line_end
+
+        if block_start is not None:
+            yield block_start, block_end, False
@@ -1,45 +1,132 @@
+import asyncio
 import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import requests
-from docling.datamodel.base_models import InputFormat
+import magic
+from docling.datamodel.base_models import InputFormat, DocumentStream
 from docling.document_converter import DocumentConverter
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional, BinaryIO
 from fastapi import HTTPException
 
+from core.config import get_settings
+from services.executors import get_executor
+
+settings = get_settings()
+
+# Converter owned by a conversion pool process, created by _init_pool_worker
+_pool_converter: Optional[DocumentConverter] = None
+
+
+def _create_converter() -> DocumentConverter:
+    return DocumentConverter(
+        allowed_formats=[
+            InputFormat.PDF,
+            InputFormat.IMAGE,
+            InputFormat.DOCX,
+            InputFormat.HTML,
+            InputFormat.PPTX,
+            InputFormat.ASCIIDOC,
+            InputFormat.MD,
+        ]
+    )
+
+
+def _to_document_stream(filename: str, file_data: BinaryIO) -> DocumentStream:
+    if not isinstance(file_data, io.BytesIO):
+        # Spooled or on-disk files are read once into memory, Docling parses from there
+        file_data = io.BytesIO(file_data.read())
+    file_data.seek(0)
+    return DocumentStream(name=filename, stream=file_data)
+
+
+def _convert(converter: DocumentConverter, filename: str, file_data: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+    document_stream = _to_document_stream(filename, file_data)
+    try:
+
+        # Convert document
+        result = converter.convert(document_stream)
+
+        # Get markdown content and metadata
+        markdown_content = result.document.export_to_markdown()
+        # metadata = result.document.metadata
+
+        return markdown_content, dict()
+    except Exception as e:
+        file_content = document_stream.stream.getvalue()
+        if magic.from_buffer(file_content[:2048], mime=True) != "text/plain":
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing file with Docling: {str(e)}"
+            )
+
+        return file_content.decode(errors="replace"), dict()
+
+
+def _init_pool_worker():
+    global _pool_converter
+    _pool_converter = _create_converter()
+
+
+def _convert_in_pool_worker(filename: str, data: bytes) -> Tuple[str, Dict[str, Any]]:
+    try:
+        return _convert(_pool_converter, filename, io.BytesIO(data))
+    except HTTPException as e:
+        # HTTPException does not survive pickling back to the parent process
+        raise RuntimeError(e.detail)
+
 
 class DocumentService:
     def __init__(self):
-        self.converter = DocumentConverter(
-            allowed_formats=[
-                InputFormat.PDF,
-                InputFormat.IMAGE,
-                InputFormat.DOCX,
-                InputFormat.HTML,
-                InputFormat.PPTX,
-                InputFormat.ASCIIDOC,
-                InputFormat.MD,
-            ]
+        self._pool_size = settings.CONVERSION_PROCESSES or os.cpu_count() or 1
+        self._pool_slots = asyncio.Semaphore(settings.CONVERSION_MAX_PENDING or self._pool_size * 2)
+        self.executor = get_executor(
+            "conversion",
+            workers=self._pool_size,
+            executor_factory=lambda workers: ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_worker
+            )
         )
 
-    async def process_file(self, source: str) -> Tuple[str, Dict[str, Any]]:
-        """Process file content with Docling"""
-        try:
+    def convert(self, filename: str, file_data: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+        """
+        Convert a document in the conversion process pool, blocking, for use outside the event loop
 
-            # Convert document
-            result = self.converter.convert(source)
+        The document is converted from the given in-memory or spooled file, so
+        Docling never downloads it back from storage.
+        """
+        file_data.seek(0)
+        data = file_data.read()
+        try:
+            return self.executor.run_sync(_convert_in_pool_worker, filename, data)
+        except BrokenProcessPool:
+            raise HTTPException(status_code=500, detail="Docling conversion worker crashed")
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            # Get markdown content and metadata
-            markdown_content = result.document.export_to_markdown()
-            # metadata = result.document.metadata
+    async def process_file_in_pool(self, filename: str, file_data: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+        """
+        Process file content with Docling in the conversion process pool.
 
-            return markdown_content, dict()
-        except Exception as e:
-            request = requests.get(source)
-            if request.status_code != 200 or request.headers.get("Content-Type", None) != "text/plain":
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error processing file with Docling: {str(e)}"
-                )
+        Waits for a free slot when CONVERSION_MAX_PENDING conversions are already
+        submitted, so callers are slowed down instead of growing the pool queue.
+        Admission is checked by the caller, with self.executor.admit(), before
+        accepting the request.
+        """
+        async with self._pool_slots:
+            file_data.seek(0)
+            data = file_data.read()
+            try:
+                return await self.executor.run(_convert_in_pool_worker, filename, data, admit=False)
+            except BrokenProcessPool:
+                raise HTTPException(status_code=500, detail="Docling conversion worker crashed")
+            except RuntimeError as e:
+                raise HTTPException(status_code=500, detail=str(e))
 
-            file_content = request.content.decode()
-            return file_content, dict()
+    def shutdown(self):
+        """Stop the conversion process pool"""
+        self.executor.shutdown()
@@ -0,0 +1,115 @@
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import get_settings
+
+settings = get_settings()
+
+
+class QueryEmbeddingBatcher:
+    """
+    Groups concurrent query embeddings into a single batched forward pass.
+
+    Queries wait at most QUERY_BATCH_MAX_WAIT_MS for others to join the batch, or
+    until QUERY_BATCH_MAX_SIZE queries are pending. Recent query embeddings are
+    kept in a small LRU so repeated queries skip the model.
+    """
+
+    def __init__(
+            self,
+            encode_fn: Callable[[List[str]], np.ndarray],
+            max_batch_size: int,
+            max_wait_ms: float,
+            lru_size: int
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.lru_size = lru_size
+        self._lru: OrderedDict[str, List[float]] = OrderedDict()
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks, a running batch could otherwise be collected
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"queries": 0, "lru_hits": 0, "batches": 0, "batched_queries": 0}
+
+    async def embed(self, query: str) -> List[float]:
+        """Embed a query, sharing the forward pass with concurrent callers"""
+        self._stats["queries"] += 1
+        cached = self._lru.get(query)
+        if cached is not None:
+            self._lru.move_to_end(query)
+            self._stats["lru_hits"] += 1
+            return cached
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(query for query, _ in batch))
+        try:
+            embeddings = await run_in_threadpool(self.encode_fn, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._stats["batches"] += 1
+        self._stats["batched_queries"] += len(batch)
+
+        by_text = {text: embedding.tolist() for text, embedding in zip(texts, embeddings)}
+        for text, embedding in by_text.items():
+            self._lru[text] = embedding
+            self._lru.move_to_end(text)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+        for query, future in batch:
+            if not future.done():
+                future.set_result(by_text[query])
+
+    def get_stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["average_batch_size"] = stats["batched_queries"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+
+_batchers: Dict[str, QueryEmbeddingBatcher] = {}
+
+
+def get_query_batcher(model_id: str, encode_fn: Callable[[List[str]], np.ndarray]) -> QueryEmbeddingBatcher:
+    """Get the process-wide batcher of a model, so every service batches together"""
+    if model_id not in _batchers:
+        _batchers[model_id] = QueryEmbeddingBatcher(
+            encode_fn,
+            max_batch_size=settings.QUERY_BATCH_MAX_SIZE,
+            max_wait_ms=settings.QUERY_BATCH_MAX_WAIT_MS,
+            lru_size=settings.QUERY_EMBEDDING_LRU_SIZE
+        )
+    return _batchers[model_id]
+
+
+def get_batcher_stats() -> dict:
+    return {model_id: batcher.get_stats() for model_id, batcher in _batchers.items()}
@@ -0,0 +1,82 @@
+import hashlib
+import unicodedata
+from functools import lru_cache
+from typing import Callable, List
+
+import numpy as np
+from diskcache import Cache
+
+from core.config import get_settings
+
+settings = get_settings()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a chunk so trivially different copies share a cache entry"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of chunk embeddings keyed by model id and normalized text hash.
+
+    diskcache is thread and process safe, so every ingestion worker pointing at the
+    same directory shares the entries. Least recently used entries are evicted once
+    the cache grows over its size limit.
+    """
+
+    def __init__(self, directory: str, size_limit: int):
+        self.cache = Cache(directory, size_limit=size_limit, eviction_policy="least-recently-used")
+        self.cache.stats(enable=True)
+
+    @staticmethod
+    def _key(model_id: str, text: str) -> str:
+        return f"{model_id}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    def encode(
+            self,
+            model_id: str,
+            texts: List[str],
+            encode_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """Embed texts, sending only the cache misses to encode_fn"""
+        normalized = [normalize_text(t) for t in texts]
+        results = [None] * len(texts)
+        missing = {}
+
+        for i, text in enumerate(normalized):
+            key = self._key(model_id, text)
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.setdefault(key, (text, []))[1].append(i)
+            else:
+                results[i] = np.frombuffer(cached, dtype=np.float32)
+
+        if missing:
+            embeddings = encode_fn([text for text, _ in missing.values()])
+            for key, (_, indices), embedding in zip(missing.keys(), missing.values(), embeddings):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                self.cache.set(key, embedding.tobytes())
+                for i in indices:
+                    results[i] = embedding
+
+        if not results:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(results)
+
+    def get_stats(self) -> dict:
+        """Hit and miss counts across every process sharing the cache"""
+        hits, misses = self.cache.stats()
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.cache),
+            "size_bytes": self.cache.volume()
+        }
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(settings.EMBEDDING_CACHE_DIR, settings.EMBEDDING_CACHE_SIZE_LIMIT)
@@ -0,0 +1,194 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from core.config import get_settings
+
+settings = get_settings()
+
+# Weight of the latest task in the moving average of run times
+_RUN_TIME_SMOOTHING = 0.2
+
+
+def _timed(fn: Callable, *args):
+    """Run fn and report when it started and finished, measured in the worker so queueing time can be told apart"""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class WorkloadExecutor:
+    """
+    Bounded pool for one class of blocking work, so it cannot starve the event loop or other workloads.
+
+    Callers are admitted only while the estimated queue wait, from the tasks
+    ahead and the average run time, stays under max_queue_wait seconds;
+    otherwise they are turned away at once with a 503 and a Retry-After.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            workers: int,
+            max_queue_wait: float,
+            executor_factory: Optional[Callable[[int], Executor]] = None
+    ):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue_wait = max_queue_wait
+        self.executor_factory = executor_factory or (
+            lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-executor")
+        )
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        # The counters are also updated by the ingestion threads, through run_sync
+        self._counters_lock = threading.Lock()
+        self.pending = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "max_wait_seconds": 0.0}
+        self._average_wait = 0.0
+        self._average_run = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.executor_factory(self.workers)
+            return self._executor
+
+    def estimated_wait(self) -> float:
+        """Seconds a task submitted now is expected to wait for a worker"""
+        queued = max(0, self.pending - self.workers + 1)
+        return queued * self._average_run / self.workers
+
+    def admit(self):
+        """Reject the caller right away when the queue is already longer than max_queue_wait"""
+        wait = self.estimated_wait()
+        if self.max_queue_wait and wait > self.max_queue_wait:
+            self._stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"The {self.name} queue is full, retry later",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+    async def run(self, fn: Callable, *args, admit: bool = True):
+        """Run fn(*args) on the pool, checking admission first unless the caller already did"""
+        if admit:
+            self.admit()
+
+        self._count_pending(1)
+        submitted = time.time()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _timed, fn, *args
+            )
+        except BrokenProcessPool:
+            self._stats["failed"] += 1
+            self._executor = None
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._count_pending(-1)
+
+        self._record(submitted, started, finished)
+        return result
+
+    def run_sync(self, fn: Callable, *args):
+        """
+        Run fn(*args) on the pool from a thread outside the event loop, blocking until it is done
+
+        Background work is never rejected, but it is counted in the queue the
+        requests are admitted against.
+        """
+        self._count_pending(1)
+        submitted = time.time()
+        try:
+            result, started, finished = self.executor.submit(_timed, fn, *args).result()
+        except BrokenProcessPool:
+            self._stats["failed"] += 1
+            self._executor = None
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._count_pending(-1)
+
+        self._record(submitted, started, finished)
+        return result
+
+    def _count_pending(self, delta: int):
+        with self._counters_lock:
+            self.pending += delta
+
+    def _record(self, submitted: float, started: float, finished: float):
+        with self._counters_lock:
+            wait = max(0.0, started - submitted)
+            # The first task seeds the averages, so admission is not lenient while they warm up
+            smoothing = _RUN_TIME_SMOOTHING if self._stats["completed"] else 1.0
+            self._average_wait += smoothing * (wait - self._average_wait)
+            self._average_run += smoothing * (finished - started - self._average_run)
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+            self._stats["completed"] += 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def get_stats(self) -> dict:
+        return self._stats | {
+            "workers": self.workers,
+            "queue_depth": max(0, self.pending - self.workers),
+            "in_flight": self.pending,
+            "average_wait_seconds": self._average_wait,
+            "average_run_seconds": self._average_run,
+            "estimated_wait_seconds": self.estimated_wait(),
+            "max_queue_wait_seconds": self.max_queue_wait
+        }
+
+
+# Workers and admission limit of each workload class
+WORKLOADS = {
+    "conversion": lambda: (settings.CONVERSION_PROCESSES or 1, settings.CONVERSION_MAX_QUEUE_WAIT_SECONDS),
+    "embedding": lambda: (settings.EMBEDDING_WORKERS, settings.EMBEDDING_MAX_QUEUE_WAIT_SECONDS),
+    "classification": lambda: (settings.CLASSIFICATION_WORKERS, settings.CLASSIFICATION_MAX_QUEUE_WAIT_SECONDS),
+    "llm": lambda: (settings.LLM_WORKERS, settings.LLM_MAX_QUEUE_WAIT_SECONDS),
+}
+
+_executors: Dict[str, WorkloadExecutor] = {}
+
+
+def get_executor(
+        workload: str,
+        workers: Optional[int] = None,
+        executor_factory: Optional[Callable[[int], Executor]] = None
+) -> WorkloadExecutor:
+    """Get the process-wide executor of a workload, created with the configured size on first use"""
+    if workload not in _executors:
+        configured_workers, max_queue_wait = WORKLOADS[workload]()
+        _executors[workload] = WorkloadExecutor(
+            workload,
+            workers or configured_workers,
+            max_queue_wait,
+            executor_factory
+        )
+    return _executors[workload]
+
+
+def get_executor_stats() -> dict:
+    return {name: executor.get_stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown()
@@ -0,0 +1,273 @@
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from crud import file as file_crud
+from crud import job as job_crud
+from crud import vectorSearch as vector_search_crud
+from db.database import SessionLocal
+from models.file import FileMetadata
+from models.job import IngestionJob
+from services.categories import CategoryService
+from services.chunker import CHUNKER_VERSION
+from services.docling import DocumentService
+from services.executors import get_executor
+from services.minio import MinioService
+from services.vectorSearch import VectorSearchService
+
+settings = get_settings()
+
+
+class IngestionService:
+    """
+    Runs the convert -> embed -> classify -> persist pipeline for uploaded files.
+
+    Each stage runs on the executor of its workload, the conversion in the
+    Docling process pool, so request admission accounts for it.
+
+    Jobs are stored in Postgres, so a job left running by a crashed worker is
+    picked up again by any worker once its lease expires.
+    """
+
+    def __init__(
+            self,
+            minio_service: MinioService,
+            document_service: DocumentService,
+            categories_service: CategoryService,
+            vector_search_service: VectorSearchService
+    ):
+        self.minio_service = minio_service
+        self.document_service = document_service
+        self.categories_service = categories_service
+        self.vector_search_service = vector_search_service
+        self._stop = threading.Event()
+        self._workers: list[threading.Thread] = []
+
+    def enqueue(
+            self,
+            db: Session,
+            file_id: str,
+            filename: str,
+            content_type: str,
+            user_id: str,
+            content_hash: Optional[str] = None,
+            size: Optional[int] = None,
+            last_modified: Optional[datetime] = None
+    ) -> IngestionJob:
+        """Queue a stored file for ingestion"""
+        return job_crud.create_job(
+            db=db,
+            file_id=file_id,
+            filename=filename,
+            content_type=content_type,
+            user_id=user_id,
+            content_hash=content_hash,
+            max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+            size=size,
+            last_modified=last_modified
+        )
+
+    def enqueue_rechunk(self, db: Session) -> int:
+        """Queue a rechunk job for every file indexed by an older chunker, returns how many were queued"""
+        queued = 0
+        for file_id in file_crud.get_files_to_rechunk(db, CHUNKER_VERSION):
+            if job_crud.has_active_job(db, file_id, "rechunk"):
+                continue
+            db_file = file_crud.get_file_metadata(db, file_id)
+            job_crud.create_job(
+                db=db,
+                file_id=file_id,
+                filename=db_file.filename,
+                content_type=db_file.content_type,
+                user_id=db_file.user_id,
+                content_hash=db_file.content_hash,
+                max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+                kind="rechunk"
+            )
+            queued += 1
+        return queued
+
+    def reuse_existing(
+            self,
+            db: Session,
+            file_id: str,
+            filename: str,
+            content_type: str,
+            user_id: str,
+            content_hash: Optional[str]
+    ) -> Optional[FileMetadata]:
+        """
+        Reuse the ingestion results of a file with identical bytes, if there is one.
+
+        The stored object, content, categories and vectors of the existing file are
+        shared, not copied: only a new ownership record pointing at them is created.
+        A user uploading the same bytes twice gets their existing file back. The
+        object just stored under file_id is removed. Returns None when the content
+        has not been seen before.
+        """
+        if content_hash is None:
+            return None
+
+        existing = file_crud.get_file_by_hash(db, content_hash, user_id)
+        if existing is None:
+            # Locked until the new record is committed, so its last owner cannot delete it meanwhile
+            source = file_crud.lock_content_by_hash(db, content_hash)
+            if source is None:
+                db.rollback()
+                return None
+
+            existing = file_crud.create_file_metadata(
+                db=db,
+                file_id=file_id,
+                filename=filename,
+                content_type=content_type,
+                file_metadata=None,
+                content=None,
+                user_id=user_id,
+                categories=source.categories,
+                content_hash=content_hash,
+                object_name=source.object_name,
+                content_id=source.id,
+                chunker_version=source.chunker_version,
+                size=source.size,
+                last_modified=source.last_modified
+            )
+
+        if existing.object_name != file_id:
+            try:
+                self.minio_service.delete_file(file_id)
+            except HTTPException:
+                pass  # Already removed by an earlier attempt
+        return existing
+
+    def start(self):
+        """Start the ingestion worker threads"""
+        self._stop.clear()
+        for i in range(settings.INGESTION_WORKERS):
+            worker_id = f"{uuid.uuid4().hex[:8]}-{i}"
+            worker = threading.Thread(target=self._run, args=(worker_id,), name=f"ingestion-{worker_id}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """Ask the workers to stop after their current job"""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout=settings.INGESTION_POLL_INTERVAL * 2)
+        self._workers = []
+
+    def _run(self, worker_id: str):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                db_job = job_crud.claim_next_job(db, worker_id, settings.INGESTION_LEASE_SECONDS)
+                if db_job is None:
+                    self._stop.wait(settings.INGESTION_POLL_INTERVAL)
+                    continue
+
+                # A single stage can outlast the lease, it is renewed until the job is done
+                processed = threading.Event()
+                heartbeat = threading.Thread(target=self._heartbeat, args=(db_job.id, worker_id, processed),
+                                             name=f"ingestion-heartbeat-{worker_id}", daemon=True)
+                heartbeat.start()
+                try:
+                    file_id = self._process(db, db_job, worker_id)
+                    if not job_crud.complete_job(db, db_job, worker_id, file_id):
+                        print(f"Ingestion job {db_job.id} finished after another worker claimed it")
+                except job_crud.LeaseLostError as e:
+                    print(f"Ingestion job {db_job.id} abandoned: {e}")
+                    db.rollback()
+                except Exception as e:
+                    print(f"Ingestion error for job {db_job.id}: {e}")
+                    db.rollback()
+                    job_crud.fail_job(db, db_job, worker_id, str(e), settings.INGESTION_RETRY_BACKOFF_SECONDS)
+                finally:
+                    processed.set()
+                    heartbeat.join()
+            except Exception as e:
+                print(f"Ingestion worker {worker_id} error: {e}")
+                self._stop.wait(settings.INGESTION_POLL_INTERVAL)
+            finally:
+                db.close()
+
+    def _heartbeat(self, job_id: str, worker_id: str, processed: threading.Event):
+        """Renew the lease of a job every third of INGESTION_LEASE_SECONDS until it is processed"""
+        while not processed.wait(settings.INGESTION_LEASE_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                if not job_crud.renew_lease(db, job_id, worker_id, settings.INGESTION_LEASE_SECONDS):
+                    return  # Claimed by another worker, the next stage update stops this one
+            except Exception as e:
+                print(f"Lease renewal error for job {job_id}: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    def _process(self, db: Session, db_job: IngestionJob, worker_id: str) -> Optional[str]:
+        """Run a job, returns the id of the existing file it resolved to when its bytes were already ingested"""
+        if db_job.kind == "rechunk":
+            return self._rechunk(db, db_job, worker_id)
+
+        lease = settings.INGESTION_LEASE_SECONDS
+
+        # Persisted by an earlier attempt that stopped before completing the job, the file and vectors are
+        # committed together so the row is whole
+        if file_crud.get_file_metadata(db, db_job.file_id) is not None:
+            return
+
+        # Identical bytes may have been ingested while this job was queued
+        existing = self.reuse_existing(db, db_job.file_id, db_job.filename, db_job.content_type, db_job.user_id,
+                                       db_job.content_hash)
+        if existing is not None:
+            return existing.id
+
+        job_crud.update_job_stage(db, db_job, worker_id, "converting", lease)
+        file_data = self.minio_service.read_file(db_job.file_id)
+        markdown_content, file_metadata = self.document_service.convert(db_job.filename, file_data)
+        del file_data
+
+        job_crud.update_job_stage(db, db_job, worker_id, "embedding", lease)
+        vectors = get_executor("embedding").run_sync(self.vector_search_service.index, markdown_content)
+
+        job_crud.update_job_stage(db, db_job, worker_id, "classifying", lease)
+        categories = get_executor("classification").run_sync(
+            self.categories_service.get_categories_for,
+            markdown_content,
+            [vector["embedding"] for vector in vectors]
+        )
+
+        job_crud.update_job_stage(db, db_job, worker_id, "persisting", lease)
+        file_crud.create_file_metadata(
+            db=db,
+            file_id=db_job.file_id,
+            filename=db_job.filename,
+            content_type=db_job.content_type,
+            file_metadata=file_metadata,
+            content=markdown_content,
+            user_id=db_job.user_id,
+            categories=categories,
+            content_hash=db_job.content_hash,
+            chunker_version=CHUNKER_VERSION,
+            size=db_job.size,
+            last_modified=db_job.last_modified,
+            vectors=vectors
+        )
+
+    def _rechunk(self, db: Session, db_job: IngestionJob, worker_id: str):
+        """Re-index an ingested file with the current chunker, from its stored content"""
+        lease = settings.INGESTION_LEASE_SECONDS
+
+        db_file = file_crud.get_file_metadata(db, db_job.file_id)
+        if db_file is None:
+            return  # Deleted since the job was queued
+
+        job_crud.update_job_stage(db, db_job, worker_id, "embedding", lease)
+        vectors = get_executor("embedding").run_sync(self.vector_search_service.index, db_file.content)
+
+        job_crud.update_job_stage(db, db_job, worker_id, "persisting", lease)
+        vector_search_crud.replace_vector_entries(db, vectors, db_job.file_id, CHUNKER_VERSION)
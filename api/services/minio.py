@@ -1,15 +1,58 @@
+import hashlib
+import io
 import unicodedata
-from typing import BinaryIO, Dict, Optional
+from datetime import timedelta, timezone
+from typing import BinaryIO, Dict, Optional, Any, Iterator, List
 
 import magic
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 
 from core.config import get_settings
-from core.minio import minio_client
+from core.minio import minio_client, presign_client
 
 settings = get_settings()
 
+# Bytes read up front to detect the MIME type
+SNIFF_SIZE = 2048
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+class _UploadReader:
+    """Readable wrapper that hashes and counts an upload while MinIO consumes it"""
+
+    def __init__(self, stream: BinaryIO, first_chunk: bytes, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._track(first_chunk)
+        self._pending = first_chunk
+
+    def _track(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise FileTooLargeError(f"File exceeds the maximum upload size of {self.max_size} bytes")
+        self.sha256.update(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        data = b""
+        if self._pending:
+            data = self._pending if size < 0 else self._pending[:size]
+            self._pending = self._pending[len(data):]
+            if size >= 0:
+                size -= len(data)
+        if size != 0:
+            chunk = self.stream.read(size)
+            self._track(chunk)
+            data += chunk
+        return data
+
 
 class MinioService:
     def __init__(self):
@@ -20,40 +63,91 @@ class MinioService:
             self,
             file_id: str,
             file_data: BinaryIO,
-            file_size: int,
-            metadata: Dict[str, str]
-    ) -> str:
-        """Upload a file to MinIO"""
+            metadata: Dict[str, str],
+            max_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream a file to MinIO as a multipart upload
+
+        The file is read part by part, so memory use is bounded by MINIO_PART_SIZE
+        whatever the file size. Uploads larger than max_size are aborted with a 413.
+        """
         try:
+            first_chunk = file_data.read(SNIFF_SIZE)
             mime = magic.Magic(mime=True)
-            content_type = mime.from_buffer(file_data.read(1024))
-            file_data.seek(0)
+            content_type = mime.from_buffer(first_chunk)
             metadata["filename"] = metadata["filename"].encode('ascii', 'ignore').decode('ascii')
 
-            self.client.put_object(
+            reader = _UploadReader(file_data, first_chunk, max_size or settings.MAX_UPLOAD_SIZE)
+            result = await run_in_threadpool(
+                self.client.put_object,
                 self.bucket_name,
                 file_id,
-                data=file_data,
+                data=reader,
                 content_type=content_type,
-                length=file_size,
+                length=-1,
                 metadata=metadata,
-                part_size=10 * 1024 * 1024  # 10MB parts
+                part_size=settings.MINIO_PART_SIZE
             )
 
-            return self.client.presigned_get_object(self.bucket_name, file_id)
+            # Multipart completions carry no Last-Modified, the object time is then read back once
+            last_modified = result.last_modified
+            if last_modified is None:
+                stat = await run_in_threadpool(self.client.stat_object, self.bucket_name, file_id)
+                last_modified = stat.last_modified
 
+            return {
+                "size": reader.size,
+                "sha256": reader.sha256.hexdigest(),
+                "content_type": content_type,
+                "last_modified": last_modified.astimezone(timezone.utc).replace(tzinfo=None)
+            }
+
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         except S3Error as e:
             raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
 
-    def download_file(self, file_id: str) -> tuple[BinaryIO, Dict[str, str]]:
-        """Download a file from MinIO"""
+    def open_object(self, object_name: str, offset: int = 0, length: int = 0):
+        """Open a stored object for reading, from offset for length bytes (0 reads to the end)"""
         try:
-            data = self.client.get_object(self.bucket_name, file_id)
-            stat = self.client.stat_object(self.bucket_name, file_id)
-            return data, stat.metadata
+            return self.client.get_object(self.bucket_name, object_name, offset=offset, length=length)
+        except S3Error:
+            raise HTTPException(status_code=404, detail="File not found")
+
+    @staticmethod
+    def stream_object(response) -> Iterator[bytes]:
+        """Yield an opened object in DOWNLOAD_CHUNK_SIZE chunks, releasing the connection at the end"""
+        try:
+            yield from response.stream(settings.DOWNLOAD_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def stat_object(self, object_name: str):
+        """Get the size, ETag and modification time of a stored object"""
+        try:
+            return self.client.stat_object(self.bucket_name, object_name)
         except S3Error:
             raise HTTPException(status_code=404, detail="File not found")
 
+    def presigned_download_url(
+            self,
+            object_name: str,
+            content_disposition: str,
+            content_type: Optional[str] = None
+    ) -> str:
+        """Short-lived URL downloading an object straight from MinIO, served with the given headers"""
+        response_headers = {"response-content-disposition": content_disposition}
+        if content_type:
+            response_headers["response-content-type"] = content_type
+        return presign_client.presigned_get_object(
+            self.bucket_name,
+            object_name,
+            expires=timedelta(seconds=settings.DOWNLOAD_URL_EXPIRY_SECONDS),
+            response_headers=response_headers
+        )
+
     def delete_file(self, file_id: str) -> bool:
         """Delete a file from MinIO"""
         try:
@@ -62,6 +156,22 @@ class MinioService:
         except S3Error:
             raise HTTPException(status_code=404, detail="File not found")
 
+    def delete_files(self, object_names: List[str]) -> Dict[str, str]:
+        """
+        Delete several objects with multi-object DELETE requests, returns the error of each object not deleted
+
+        The client sends the objects in batches of up to 1000, the most one request takes.
+        """
+        try:
+            errors = self.client.remove_objects(
+                self.bucket_name,
+                (DeleteObject(object_name) for object_name in object_names)
+            )
+            # The deletions are only sent while the errors are iterated
+            return {error.name: error.message for error in errors}
+        except S3Error as e:
+            return {object_name: str(e) for object_name in object_names}
+
     def get_file_metadata(self, file_id: str) -> Dict[str, str]:
         """Get file metadata from MinIO"""
         try:
@@ -76,4 +186,16 @@ class MinioService:
             objects = self.client.list_objects(self.bucket_name)
             return objects
         except S3Error as e:
-            raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
+
+    def read_file(self, file_id: str) -> io.BytesIO:
+        """Read a whole file from MinIO into memory"""
+        try:
+            response = self.client.get_object(self.bucket_name, file_id)
+            try:
+                return io.BytesIO(response.read())
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error:
+            raise HTTPException(status_code=404, detail="File not found")
@@ -0,0 +1,195 @@
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+# Qualifiers a term can be restricted to, anything else before a colon is part of the term
+FIELDS = ("filename", "category")
+
+MAX_QUERY_LENGTH = 1000
+MAX_TERMS = 64
+MAX_DEPTH = 32
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<phrase>"[^"]*")
+  | (?P<quote>")
+  | (?P<and>&&)
+  | (?P<or>\|\|)
+  | (?P<not>[!-])
+  | (?P<word>[^\s()"]+)
+""", re.VERBOSE)
+
+_KEYWORDS = {"AND": "and", "OR": "or", "NOT": "not"}
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Term:
+    value: str
+    field: Optional[str] = None  # None searches the document content
+    phrase: bool = False
+    prefix: bool = False
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: "Node"
+
+
+@dataclass(frozen=True)
+class And:
+    operands: List["Node"]
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: List["Node"]
+
+
+Node = Union[Term, Not, And, Or]
+
+
+@dataclass
+class _Token:
+    kind: str
+    value: str
+    position: int
+
+
+def tokenize(query: str) -> List[_Token]:
+    """Split a query into tokens in a single left to right pass"""
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        kind, value = match.lastgroup, match.group()
+        if kind == "quote":
+            raise QuerySyntaxError(f"Unterminated phrase at position {position}")
+        if kind == "word" and value in _KEYWORDS:
+            kind = _KEYWORDS[value]
+        if kind != "space":
+            tokens.append(_Token(kind, value, position))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser for the grammar, from lowest to highest precedence:
+
+        query    := or_expr
+        or_expr  := and_expr (("OR" | "||") and_expr)*
+        and_expr := not_expr ([("AND" | "&&")] not_expr)*
+        not_expr := ("NOT" | "!" | "-") not_expr | primary
+        primary  := "(" or_expr ")" | [field ":"] (word | "phrase")
+    """
+
+    def __init__(self, tokens: List[_Token]):
+        self.tokens = tokens
+        self.index = 0
+        self.depth = 0
+        self.terms = 0
+
+    def peek(self) -> Optional[_Token]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def next(self) -> _Token:
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError("Unexpected end of query")
+        self.index += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self.or_expr()
+        token = self.peek()
+        if token is not None:
+            raise QuerySyntaxError(f"Unexpected '{token.value}' at position {token.position}")
+        return node
+
+    def or_expr(self) -> Node:
+        operands = [self.and_expr()]
+        while self.peek() is not None and self.peek().kind == "or":
+            self.next()
+            operands.append(self.and_expr())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def and_expr(self) -> Node:
+        operands = [self.not_expr()]
+        while self.peek() is not None and self.peek().kind not in ("or", "rparen"):
+            if self.peek().kind == "and":
+                self.next()
+            operands.append(self.not_expr())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def not_expr(self) -> Node:
+        if self.peek() is not None and self.peek().kind == "not":
+            self.next()
+            with self.nested():
+                return Not(self.not_expr())
+        return self.primary()
+
+    def primary(self) -> Node:
+        token = self.next()
+        if token.kind == "lparen":
+            with self.nested():
+                node = self.or_expr()
+            closing = self.peek()
+            if closing is None or closing.kind != "rparen":
+                raise QuerySyntaxError(f"Unbalanced parenthesis at position {token.position}")
+            self.next()
+            return node
+        if token.kind == "phrase":
+            return self.term(token.value[1:-1], phrase=True)
+        if token.kind == "word":
+            field, _, value = token.value.partition(":")
+            if value or token.value.endswith(":"):
+                if field.lower() in FIELDS:
+                    if not value:
+                        qualified = self.next()
+                        if qualified.kind not in ("word", "phrase"):
+                            raise QuerySyntaxError(f"Missing value for {field}: at position {token.position}")
+                        is_phrase = qualified.kind == "phrase"
+                        value = qualified.value[1:-1] if is_phrase else qualified.value
+                        return self.term(value, field.lower(), phrase=is_phrase)
+                    return self.term(value, field.lower())
+            return self.term(token.value)
+        raise QuerySyntaxError(f"Unexpected '{token.value}' at position {token.position}")
+
+    def term(self, value: str, field: Optional[str] = None, phrase: bool = False) -> Term:
+        self.terms += 1
+        if self.terms > MAX_TERMS:
+            raise QuerySyntaxError(f"Queries are limited to {MAX_TERMS} terms")
+        prefix = not phrase and field is None and len(value) > 1 and value.endswith("*")
+        return Term(value[:-1] if prefix else value, field, phrase, prefix)
+
+    @contextmanager
+    def nested(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise QuerySyntaxError(f"Queries are limited to {MAX_DEPTH} levels of nesting")
+        try:
+            yield
+        finally:
+            self.depth -= 1
+
+
+def parse_query(query: str) -> Optional[Node]:
+    """
+    Parse a filter query such as `deep learning AND (filename:report OR "neural network") NOT category:Physics`.
+
+    Terms next to each other are ANDed, NOT binds tighter than AND, which binds
+    tighter than OR. Returns None for an empty query and raises QuerySyntaxError
+    for malformed ones, never any other exception.
+    """
+    if query is None or not query.strip():
+        return None
+    if len(query) > MAX_QUERY_LENGTH:
+        raise QuerySyntaxError(f"Queries are limited to {MAX_QUERY_LENGTH} characters")
+    return _Parser(tokenize(query)).parse()
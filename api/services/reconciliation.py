@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from crud import file as file_crud
+from crud import job as job_crud
+from db.database import SessionLocal
+from services.minio import MinioService
+
+settings = get_settings()
+
+# HTTP dates have a one second resolution, so times closer than this are the same
+_TIME_TOLERANCE = timedelta(seconds=1)
+
+
+def _utc(timestamp: datetime) -> datetime:
+    """MinIO timestamps are timezone aware, the file_metadata columns hold naive UTC"""
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class ReconciliationService:
+    """
+    Keeps the size and last_modified of file_metadata in sync with the bucket.
+
+    A pass lists the bucket once, without a stat per object, and compares it with
+    the file index: rows whose object changed are updated, rows whose object is
+    gone are reported, and objects no row nor pending ingestion job refers to are
+    reported as orphans and optionally removed.
+    """
+
+    def __init__(self, minio_service: MinioService):
+        self.minio_service = minio_service
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self.last_run: Optional[dict] = None
+
+    def reconcile(self, db: Session, delete_orphans: Optional[bool] = None) -> dict:
+        """Run one reconciliation pass, returns what was found and changed"""
+        if delete_orphans is None:
+            delete_orphans = settings.FILE_RECONCILE_DELETE_ORPHANS
+
+        objects = {obj.object_name: obj for obj in self.minio_service.list_files()}
+
+        changes = []
+        missing = []
+        referenced = job_crud.get_pending_file_ids(db)
+        for file_id, object_name, size, last_modified in file_crud.get_stored_objects(db):
+            referenced.add(object_name)
+            obj = objects.get(object_name)
+            if obj is None:
+                missing.append(file_id)
+                continue
+            stored_at = _utc(obj.last_modified)
+            if size != obj.size or last_modified is None or abs(last_modified - stored_at) > _TIME_TOLERANCE:
+                changes.append({"id": file_id, "size": obj.size, "last_modified": stored_at})
+        file_crud.update_stored_objects(db, changes)
+
+        # Objects this recent may belong to an upload whose job or metadata is not committed yet
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.FILE_RECONCILE_GRACE_SECONDS)
+        orphans = [
+            name for name, obj in objects.items()
+            if name not in referenced and _utc(obj.last_modified) < cutoff
+        ]
+        deleted = 0
+        if delete_orphans and orphans:
+            deleted = len(orphans) - len(self.minio_service.delete_files(orphans))
+
+        self.last_run = {
+            "finished_at": datetime.utcnow().isoformat(),
+            "objects": len(objects),
+            "updated": len(changes),
+            "missing_objects": missing,
+            "orphaned_objects": orphans,
+            "deleted_orphans": deleted
+        }
+        return self.last_run
+
+    def start(self):
+        """Reconcile every FILE_RECONCILE_INTERVAL_SECONDS in a background thread, if configured"""
+        if settings.FILE_RECONCILE_INTERVAL_SECONDS <= 0:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="file-reconciliation", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _run(self):
+        while not self._stop.wait(settings.FILE_RECONCILE_INTERVAL_SECONDS):
+            db = SessionLocal()
+            try:
+                result = self.reconcile(db)
+                print(f"File reconciliation: {result['updated']} updated, {len(result['missing_objects'])} missing, "
+                      f"{len(result['orphaned_objects'])} orphaned, {result['deleted_orphans']} deleted")
+            except Exception as e:
+                print(f"File reconciliation error: {e}")
+                db.rollback()
+            finally:
+                db.close()
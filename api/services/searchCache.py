@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Optional
+
+from diskcache import Cache
+
+from core.config import get_settings
+
+settings = get_settings()
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Collapse whitespace so trivially different spellings of a query share an entry"""
+    return " ".join((query or "").split())
+
+
+class _MemoryBackend:
+    """
+    Per-process LRU dictionary with a TTL on every entry.
+
+    Generations are per process too, so a file change handled by one worker
+    does not invalidate the entries of the others: only for a single worker.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.generations: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def generation(self, user_id: str) -> int:
+        return self.generations.get(user_id, 0)
+
+    def bump(self, user_id: str):
+        with self.lock:
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _DiskBackend:
+    """diskcache directory shared by every process of the host, evicting least recently used entries"""
+
+    def __init__(self, directory: str, size_limit: int):
+        self.cache = Cache(directory, size_limit=size_limit, eviction_policy="least-recently-used")
+        # Kept apart from the entries and never evicted, a generation evicted back to 0 would revive stale entries
+        self.generations = Cache(os.path.join(directory, "generations"), eviction_policy="none")
+
+    def get(self, key: str):
+        return self.cache.get(key)
+
+    def set(self, key: str, value, ttl: float):
+        self.cache.set(key, value, expire=ttl)
+
+    def generation(self, user_id: str) -> int:
+        return self.generations.get(user_id, 0)
+
+    def bump(self, user_id: str):
+        self.generations.incr(user_id, default=0)
+
+    def __len__(self):
+        return len(self.cache)
+
+
+class SearchCache:
+    """
+    Cache of search responses, keyed by endpoint, user and request parameters.
+
+    Keys embed a per-user generation number, and invalidate(user_id) bumps it
+    whenever that user's corpus changes, so stale entries are never read again
+    and age out through the TTL and size eviction instead of being scanned for.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, kind: str, user_id: str, **params) -> str:
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{kind}:{user_id}:{self.backend.generation(user_id)}:{digest}"
+
+    def get(self, key: str):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, user_id: Optional[str]):
+        """Drop every cached response of a user"""
+        if user_id is None:
+            return
+        self.backend.bump(user_id)
+        self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        """Hit and miss counts of this process"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.SEARCH_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self.backend)
+        }
+
+
+class _DisabledCache(SearchCache):
+    def __init__(self):
+        super().__init__(_MemoryBackend(0), 0)
+
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+
+@lru_cache()
+def get_search_cache() -> SearchCache:
+    if not settings.SEARCH_CACHE_ENABLED:
+        return _DisabledCache()
+    if settings.SEARCH_CACHE_BACKEND == "disk":
+        backend = _DiskBackend(settings.SEARCH_CACHE_DIR, settings.SEARCH_CACHE_SIZE_LIMIT)
+    else:
+        backend = _MemoryBackend(settings.SEARCH_CACHE_MAX_ENTRIES)
+    return SearchCache(backend, settings.SEARCH_CACHE_TTL_SECONDS)
@@ -1,38 +1,67 @@
+from typing import Optional
+
+from fastapi import HTTPException
 from sentence_transformers import SentenceTransformer
 
-from crud.vectorSearch import search_by_vector
-from sqlalchemy.orm import Session
+from core.config import get_settings
+from core.registry import model_registry, EMBEDDING_MODEL
+from crud.vectorSearch import search_by_vector, hybrid_search, similarity_from_distance
+from services.chunker import MarkdownChunker
+from services.embeddingBatcher import get_query_batcher
+from services.embeddingCache import get_embedding_cache
+from services.queryParser import QuerySyntaxError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+settings = get_settings()
 
 
 class VectorSearchService:
     def __init__(self):
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.cache = get_embedding_cache() if settings.EMBEDDING_CACHE_ENABLED else None
+        self.query_batcher = get_query_batcher(EMBEDDING_MODEL, self._encode)
+        self._chunker: Optional[MarkdownChunker] = None
+
+    @property
+    def model(self) -> SentenceTransformer:
+        return model_registry.get(EMBEDDING_MODEL)
+
+    def _encode(self, texts: list[str]):
+        return self.model.encode(texts)
+
+    def encode_chunks(self, chunks: list[str]):
+        """Embed document chunks, reusing cached embeddings of repeated text"""
+        if self.cache is None:
+            return self._encode(chunks)
+        # Backends produce slightly different vectors, so they do not share entries
+        return self.cache.encode(f"{EMBEDDING_MODEL}:{settings.INFERENCE_BACKEND}", chunks, self._encode)
+
+    @property
+    def chunker(self) -> MarkdownChunker:
+        if self._chunker is None:
+            tokenizer = self.model.tokenizer
+            self._chunker = MarkdownChunker(
+                count_tokens=lambda text: len(tokenizer.tokenize(text)),
+                # Text past the model sequence length would be silently truncated
+                max_tokens=min(settings.CHUNK_MAX_TOKENS, self.model.max_seq_length),
+                overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+            )
+        return self._chunker
 
     def index(self, markdown_text: str):
-        text = markdown_text.splitlines()
-        filtered_text = [t for t in text if t]
-        embeddings = self.model.encode(filtered_text)
-
-        result = []
-        counter = 0
-        emb_ix = 0
-        for i, sent in enumerate(text):
-            if len(sent) == 0:
-                counter += 1
-            else:
-                result.append({
-                    "embedding": embeddings[emb_ix],
-                    "start_position": counter,
-                    "end_position": counter + len(sent) + 1
-                })
-                counter += len(sent) + 1
-                emb_ix += 1
-
-        return result
-
-    def get_query_embedding(self, query: str):
-        return self.model.encode(query).tolist()
+        chunks = self.chunker.split(markdown_text)
+        embeddings = self.encode_chunks([chunk.text for chunk in chunks])
+
+        return [
+            {
+                "embedding": embedding,
+                "start_position": chunk.start_position,
+                "end_position": chunk.end_position
+            }
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
+
+    async def get_query_embedding(self, query: str):
+        return await self.query_batcher.embed(query)
 
     # def search_by_vector(self, db: Session, query: str):
     #     query_vec = self.get_query_embedding(query)
@@ -67,53 +96,77 @@ class VectorSearchService:
     #
     #     return sorted(final_results, key=lambda x: x["rank"], reverse=True)
 
-    def search_by_vector(self, db: Session, query: str, filters: str, context_range: int = 400):
-        query_vec = self.get_query_embedding(query)
-        results = search_by_vector(db, query_vec, filters)
+    async def hybrid_search(self, db: AsyncSession, query: str, user_id: str, category: Optional[str] = None,
+                            limit: int = 10, lexical_candidates: Optional[int] = None,
+                            vector_candidates: Optional[int] = None, lexical_weight: Optional[float] = None,
+                            vector_weight: Optional[float] = None, ef_search: Optional[int] = None,
+                            probes: Optional[int] = None):
+        query_vec = await self.get_query_embedding(query)
+        results = await hybrid_search(db, query, query_vec, user_id, category, limit, lexical_candidates,
+                                vector_candidates, lexical_weight, vector_weight, ef_search, probes)
+        return [
+            {
+                "file_id": row.file_id,
+                "filename": row.filename,
+                "content_type": row.content_type,
+                "content_preview": row.content_preview,
+                "categories": row.categories,
+                "score": float(row.score),
+                "lexical_rank": row.lexical_rank,
+                "vector_rank": row.vector_rank
+            }
+            for row in results
+        ]
+
+    @staticmethod
+    def _mark(row, context_range: int) -> str:
+        """Highlight a chunk in its context window, trimming cut words at the window edges"""
+        window = row.window
+        start = row.start_position - row.window_start
+        end = row.end_position - row.window_start
+
+        before = window[:start]
+        if row.window_start > 0 and " " in before:
+            before = before[before.index(" ") + 1:]
+        after = window[end:]
+        if len(after) > context_range:
+            after = after[:after.rindex(" ")] if " " in after else after[:context_range]
+
+        return before + "<mark>" + window[start:end] + "</mark>" + after
+
+    async def search_by_vector(self, db: AsyncSession, query: str, filters: str, user_id: str,
+                               context_range: int = 400, category: Optional[str] = None,
+                               ef_search: Optional[int] = None, probes: Optional[int] = None):
+        query_vec = await self.get_query_embedding(query)
+        try:
+            results = await search_by_vector(db, query_vec, filters, user_id, category, ef_search, probes,
+                                             context_range)
+        except QuerySyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+
+        # One pass over the rows, grouping the snippets of each file
+        files = {}
+        for row in results:
+            file = files.get(row.file_id)
+            if file is None:
+                file = files[row.file_id] = {
+                    "file_id": row.file_id,
+                    "filename": row.filename,
+                    "content_type": row.content_type,
+                    "snippets": [],
+                    "categories": row.categories,
+                    "distance": 0.0
+                }
+            file["snippets"].append((row.start_position, self._mark(row, context_range)))
+            file["distance"] += row.distance
 
         final_results = []
-        files = [res[1] for res in results]
-        unique_files = set(files)
-
-        for file in unique_files:
-            content = file.content
-            rank = None
-            count = 0
-            marked_sentences = []  # List to store sentences with marked phrases
-
-            # Sort results by start_position for consistent processing
-            for i, sres in enumerate(sorted(results, key=lambda x: x[0].start_position)):
-                if sres[1].id == file.id:
-                    res = sres[0]
-                    start_pos = res.start_position
-                    end_pos = res.end_position
-
-                    # Extract context around the marked phrase
-                    context_start = max(0, content.rfind(' ', 0, start_pos - context_range) + 1 if start_pos > context_range else 0)
-                    context_end = min(len(content),
-                                      content.find(' ', end_pos + context_range) if content.find(' ', end_pos + context_range) != -1 else len(
-                                          content))
-
-                    # Mark the phrase and append the surrounding context
-                    marked_phrase = (content[context_start:start_pos] + "<mark>" +
-                                     content[start_pos:end_pos] + "</mark>" +
-                                     content[end_pos:context_end])
-                    marked_sentences.append(marked_phrase)
-
-                    if rank is None:
-                        rank = sres[2]
-                    else:
-                        rank += sres[2]
-                    count += 1
-
-            # Prepare the final result for this file
-            final_results.append({
-                "file_id": file.id,
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "marked_sentences": marked_sentences,  # List of marked sentences
-                "categories": file.categories,
-                "rank": 1 - rank / count
+        for file in files.values():
+            snippets = file.pop("snippets")
+            distance = file.pop("distance") / len(snippets)
+            final_results.append(file | {
+                "marked_sentences": [snippet for _, snippet in sorted(snippets)],
+                "rank": similarity_from_distance(distance)
             })
 
         return sorted(final_results, key=lambda x: x["rank"], reverse=True)
@@ -0,0 +1,22 @@
+import os
+
+# Settings required by core.config, so modules reading them import outside the deployment environment.
+# Nothing connects to these hosts, the tests never open a database or MinIO connection
+TEST_ENVIRONMENT = {
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "test",
+    "KEYCLOAK_URL": "http://localhost:8080",
+    "KEYCLOAK_REALM": "test",
+    "KEYCLOAK_CLIENT_ID": "test",
+    "KEYCLOAK_CLIENT_SECRET": "test",
+    "MINIO_HOST": "localhost:9000",
+    "MINIO_ACCESS_KEY": "test",
+    "MINIO_SECRET_KEY": "test",
+    "MINIO_BUCKET_NAME": "test",
+}
+
+for name, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
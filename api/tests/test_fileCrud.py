@@ -0,0 +1,43 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from crud.file import list_files_async
+
+
+class _Result:
+    def all(self):
+        return []
+
+
+class _RecordingSession:
+    """Stands in for the AsyncSession, keeping the statement it was asked to run"""
+
+    def __init__(self):
+        self.statement = None
+
+    async def execute(self, statement):
+        self.statement = statement
+        return _Result()
+
+
+def _listing_params(**filters) -> dict:
+    db = _RecordingSession()
+    asyncio.run(list_files_async(db, "user", **filters))
+    return db.statement.compile(dialect=postgresql.dialect()).params
+
+
+def test_modified_range_with_an_offset_is_compared_in_naive_utc():
+    params = _listing_params(
+        modified_after=datetime.fromisoformat("2024-05-01T12:30:00+02:00"),
+        modified_before=datetime.fromisoformat("2024-05-02T00:00:00Z")
+    )
+    bounds = sorted(value for value in params.values() if isinstance(value, datetime))
+    assert bounds == [datetime(2024, 5, 1, 10, 30), datetime(2024, 5, 2)]
+    assert all(bound.tzinfo is None for bound in bounds)
+
+
+def test_naive_modified_range_is_taken_as_utc():
+    params = _listing_params(modified_after=datetime(2024, 5, 1, 12, 30))
+    assert datetime(2024, 5, 1, 12, 30) in params.values()
@@ -0,0 +1,59 @@
+from hypothesis import given, settings, strategies as st
+from sqlalchemy.dialects import postgresql
+
+from crud.vectorSearch import compile_filters
+from services.queryParser import And, Not, Or, QuerySyntaxError, Term, parse_query
+
+# Values carry the characters an injection would need, so any of them reaching the SQL text shows up
+words = st.text(alphabet=st.sampled_from("abcxyz019_*:;'\\%!-"), min_size=1, max_size=8)
+tokens = st.one_of(
+    words,
+    words.map(lambda word: f'"{word} {word}"'),
+    st.sampled_from(["filename:", "category:", "FILENAME:", "other:"]).flatmap(
+        lambda field: words.map(lambda word: field + word)
+    ),
+    st.sampled_from(["AND", "OR", "NOT", "&&", "||", "!", "-", "(", ")", '"', ":", "*"]),
+)
+queries = st.one_of(
+    st.lists(tokens, max_size=40).flatmap(
+        lambda parts: st.lists(st.sampled_from([" ", "", "\t"]), min_size=len(parts), max_size=len(parts)).map(
+            lambda separators: "".join(part + separator for part, separator in zip(parts, separators))
+        )
+    ),
+    st.text(max_size=200),
+)
+
+
+def _terms(node):
+    if isinstance(node, Term):
+        yield node
+    elif isinstance(node, Not):
+        yield from _terms(node.operand)
+    elif isinstance(node, (And, Or)):
+        for operand in node.operands:
+            yield from _terms(operand)
+
+
+@settings(max_examples=500, deadline=None)
+@given(queries)
+def test_parse_only_raises_syntax_errors(query):
+    try:
+        parse_query(query)
+    except QuerySyntaxError:
+        pass
+
+
+@settings(max_examples=500, deadline=None)
+@given(queries)
+def test_compiled_filters_are_parameterized(query):
+    try:
+        node = parse_query(query)
+    except QuerySyntaxError:
+        return
+    if node is None:
+        return
+
+    compiled = compile_filters(node).compile(dialect=postgresql.dialect())
+    # The only literal is the escape character of the filename patterns, every value is a bound parameter
+    assert "'" not in str(compiled).replace("ESCAPE '!'", "")
+    assert len(compiled.params) >= len(list(_terms(node)))
@@ -10,6 +10,7 @@ EOSQL
 psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$API_DB_NAME" <<-EOSQL
     CREATE EXTENSION IF NOT EXISTS timescaledb;
     CREATE EXTENSION IF NOT EXISTS vector;
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
     GRANT ALL PRIVILEGES ON SCHEMA public TO "$API_DB_USER";
     GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO "$API_DB_USER";
 EOSQL